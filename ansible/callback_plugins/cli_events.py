@@ -0,0 +1,128 @@
+"""Callback Ansible émettant les événements d'exécution en JSON pour le CLI"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = """
+    name: cli_events
+    type: notification
+    short_description: Événements JSON (une ligne par événement) pour cli.py
+    description:
+      - Écrit un événement JSON par début de tâche, résultat d'hôte et fin de
+        playbook dans le descripteur de fichier ANSIBLE_CLI_EVENTS_FD.
+      - Activé automatiquement par cli.py ; sans descripteur, ne fait rien.
+    requirements:
+      - variable d'environnement ANSIBLE_CLI_EVENTS_FD
+"""
+
+
+class CallbackModule(CallbackBase):
+    """Émet les événements d'exécution sur le tube ouvert par le CLI"""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "notification"
+    CALLBACK_NAME = "cli_events"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._out = None
+        self._task_start = {}
+
+        fd = os.environ.get("ANSIBLE_CLI_EVENTS_FD")
+        if fd:
+            try:
+                # Les processus lancés par les modules ne doivent pas hériter
+                # du tube, sinon le CLI attendrait leur fin pour lire EOF
+                os.set_inheritable(int(fd), False)
+                self._out = os.fdopen(int(fd), "w", buffering=1)
+            except (OSError, ValueError):
+                self._out = None
+
+    def _emit(self, event: str, **data) -> None:
+        """
+        Écrit un événement sur le tube
+
+        Args:
+            event: Type d'événement
+            **data: Données de l'événement
+        """
+        if self._out is None:
+            return
+        data["event"] = event
+        data["time"] = time.time()
+        try:
+            self._out.write(json.dumps(data, default=str) + "\n")
+        except (OSError, ValueError):
+            # CLI arrêté: l'exécution continue sans événements
+            self._out = None
+
+    @staticmethod
+    def _task_fields(task) -> dict:
+        """Champs communs décrivant une tâche"""
+        return {
+            "task": task.get_name(),
+            "role": task._role.get_name() if task._role else "",
+            "action": task.action,
+            "uuid": task._uuid,
+        }
+
+    def _host_result(self, event: str, result, **data) -> None:
+        """Émet le résultat d'une tâche sur un hôte"""
+        task = result._task
+        start = self._task_start.get(task._uuid)
+        self._emit(
+            event,
+            host=result._host.get_name(),
+            changed=bool(result._result.get("changed", False)),
+            duration=round(time.time() - start, 3) if start else None,
+            **self._task_fields(task),
+            **data,
+        )
+
+    def v2_playbook_on_start(self, playbook):
+        self._emit("playbook_start", playbook=playbook._file_name)
+
+    def v2_playbook_on_play_start(self, play):
+        self._emit("play_start", play=play.get_name())
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_start[task._uuid] = time.time()
+        self._emit("task_start", **self._task_fields(task))
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._task_start[task._uuid] = time.time()
+        self._emit("task_start", handler=True, **self._task_fields(task))
+
+    def v2_runner_on_ok(self, result):
+        self._host_result("host_ok", result)
+
+    def v2_runner_on_skipped(self, result):
+        self._host_result("host_skipped", result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._host_result(
+            "host_failed",
+            result,
+            msg=str(result._result.get("msg") or result._result.get("stderr") or ""),
+            ignore_errors=ignore_errors,
+        )
+
+    def v2_runner_on_unreachable(self, result):
+        self._host_result(
+            "host_unreachable", result, msg=str(result._result.get("msg", ""))
+        )
+
+    def v2_playbook_on_stats(self, stats):
+        self._emit(
+            "playbook_end",
+            stats={host: stats.summarize(host) for host in sorted(stats.processed)},
+        )
+        if self._out is not None:
+            self._out.close()
+            self._out = None
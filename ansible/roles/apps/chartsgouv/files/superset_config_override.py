@@ -1,5 +1,8 @@
 # /app/docker/pythonpath/superset_config_docker.py
+import os
+import sys
 from typing import Any
+from urllib.parse import quote
 
 # ------------------------
 # Application
@@ -15,13 +18,90 @@ FAVICONS = [{"href": "/static/assets/dsfr/favicon/favicon.svg"}]
 # Application - configuration
 # ------------------------
 SUPERSET_DASHBOARD_POSITION_DATA_LIMIT = 6553500
+# Pools calculés par le rôle chartsgouv (profil scaling) pour que l'ensemble
+# des processus web et Celery, replicas au maximum, reste dans le budget de
+# connexions à la base de métadonnées
+CHARTSGOUV_TIER = "WORKER" if "celery" in sys.argv[0] else "NODE"
 SQLALCHEMY_ENGINE_OPTIONS = {
-    "pool_size": 20,       # default: 5
-    "max_overflow": 30,    # default: 10
+    "pool_size": int(os.environ.get(f"CHARTSGOUV_{CHARTSGOUV_TIER}_DB_POOL_SIZE", 20)),
+    "max_overflow": int(
+        os.environ.get(f"CHARTSGOUV_{CHARTSGOUV_TIER}_DB_MAX_OVERFLOW", 30)
+    ),
     "pool_timeout": 60,    # default: 30
     "pool_recycle": 1800,  # refresh every 30 minutes to avoid stale connections
 }
 
+# ------------------------
+# Cache
+# ------------------------
+# Redis partagé par tous les pods (variables REDIS_* fournies par le chart),
+# avec une durée de vie par usage. Les réglages viennent des variables
+# CHARTSGOUV_CACHE_* (rôle chartsgouv, vars/main.yaml). Les clés sont
+# préfixées par le nom de la base de métadonnées: plusieurs instances peuvent
+# partager le même Redis sans collision.
+CHARTSGOUV_CACHE_ENABLED = (
+    os.environ.get("CHARTSGOUV_CACHE_ENABLED", "true").lower() == "true"
+)
+CHARTSGOUV_CACHE_KEY_PREFIX = "{}_{}".format(
+    os.environ.get("CHARTSGOUV_CACHE_KEY_PREFIX", "superset"),
+    os.environ.get("DB_NAME", "superset"),
+)
+
+
+def redis_url(db: str) -> str:
+    """URL d'une base du Redis partagé"""
+    return "{proto}://{auth}{host}:{port}/{db}".format(
+        proto=os.environ.get("REDIS_PROTO", "redis"),
+        auth=(
+            "{}:{}@".format(
+                quote(os.environ.get("REDIS_USER", ""), safe=""),
+                quote(os.environ["REDIS_PASSWORD"], safe=""),
+            )
+            if os.environ.get("REDIS_PASSWORD")
+            else ""
+        ),
+        host=os.environ.get("REDIS_HOST", "localhost"),
+        port=os.environ.get("REDIS_PORT", "6379"),
+        db=db,
+    )
+
+
+def redis_cache_config(
+    usage: str, timeout_env: str, default_timeout: int
+) -> dict[str, Any]:
+    """Configuration Flask-Caching d'un usage du cache (préfixe et durée propres)"""
+    return {
+        "CACHE_TYPE": "RedisCache",
+        "CACHE_DEFAULT_TIMEOUT": int(os.environ.get(timeout_env, default_timeout)),
+        "CACHE_KEY_PREFIX": f"{CHARTSGOUV_CACHE_KEY_PREFIX}_{usage}_",
+        "CACHE_REDIS_URL": redis_url(os.environ.get("REDIS_DB", "1")),
+    }
+
+
+if CHARTSGOUV_CACHE_ENABLED:
+    # Métadonnées (schémas, listes de tables, dashboards)
+    CACHE_CONFIG = redis_cache_config(
+        "metadata", "CHARTSGOUV_CACHE_METADATA_TIMEOUT", 86400
+    )
+    # Résultats des requêtes des graphiques: la durée de vie définie sur une
+    # base ou un dataset (« Cache timeout ») reste prioritaire
+    DATA_CACHE_CONFIG = redis_cache_config(
+        "data", "CHARTSGOUV_CACHE_DATA_TIMEOUT", 3600
+    )
+    # État des filtres et formulaires d'exploration: prolongés à chaque lecture
+    FILTER_STATE_CACHE_CONFIG = {
+        **redis_cache_config(
+            "filter_state", "CHARTSGOUV_CACHE_FILTER_STATE_TIMEOUT", 86400
+        ),
+        "REFRESH_TIMEOUT_ON_RETRIEVAL": True,
+    }
+    EXPLORE_FORM_DATA_CACHE_CONFIG = {
+        **redis_cache_config(
+            "explore_form_data", "CHARTSGOUV_CACHE_FILTER_STATE_TIMEOUT", 86400
+        ),
+        "REFRESH_TIMEOUT_ON_RETRIEVAL": True,
+    }
+
 # ------------------------
 # Langues
 # ------------------------
@@ -175,6 +255,83 @@ FEATURE_FLAGS: dict[str, bool] = {
     "DATASET_FOLDERS": True,
 }
 
+# ------------------------
+# Requêtes asynchrones
+# ------------------------
+# Profil async_queries du rôle chartsgouv: les requêtes des graphiques et de
+# SQL Lab sont exécutées par les workers Celery (supersetWorker), les pods web
+# ne font que déposer les requêtes et relire les résultats.
+CHARTSGOUV_ASYNC_QUERIES = (
+    os.environ.get("CHARTSGOUV_ASYNC_QUERIES", "false").lower() == "true"
+)
+
+if CHARTSGOUV_ASYNC_QUERIES:
+    CELERY_REDIS_URL = redis_url(os.environ.get("REDIS_CELERY_DB", "0"))
+
+    class CeleryConfig:
+        broker_url = CELERY_REDIS_URL
+        result_backend = CELERY_REDIS_URL
+        imports = (
+            "superset.sql_lab",
+            "superset.tasks.async_queries",
+            "superset.tasks.cache",
+            "superset.tasks.scheduler",
+        )
+        # Requêtes longues: un worker ne réserve pas de tâches à l'avance
+        worker_prefetch_multiplier = int(
+            os.environ.get("CHARTSGOUV_CELERY_PREFETCH", "1")
+        )
+        task_acks_late = False
+
+    CELERY_CONFIG = CeleryConfig
+
+    # Résultats des requêtes, relus par les pods web
+    if os.environ.get("CHARTSGOUV_RESULTS_BACKEND", "redis") == "s3":
+        # MinIO: paquet s3werkzeugcache, identifiants AWS_* et AWS_ENDPOINT_URL
+        from s3cache.s3cache import S3Cache
+
+        RESULTS_BACKEND = S3Cache(
+            os.environ["CHARTSGOUV_RESULTS_S3_BUCKET"],
+            os.environ.get("CHARTSGOUV_RESULTS_S3_PREFIX", "superset_results/"),
+        )
+    else:
+        from cachelib.redis import RedisCache
+
+        RESULTS_BACKEND = RedisCache(
+            host=os.environ.get("REDIS_HOST", "localhost"),
+            port=int(os.environ.get("REDIS_PORT", "6379")),
+            password=os.environ.get("REDIS_PASSWORD") or None,
+            db=int(os.environ.get("CHARTSGOUV_RESULTS_DB", "2")),
+            key_prefix=f"{CHARTSGOUV_CACHE_KEY_PREFIX}_results_",
+            default_timeout=int(os.environ.get("CHARTSGOUV_RESULTS_TIMEOUT", "86400")),
+        )
+    RESULTS_BACKEND_USE_MSGPACK = True
+
+    # Événements des requêtes (flux Redis) et jeton JWT du navigateur
+    GLOBAL_ASYNC_QUERIES_CACHE_BACKEND = {
+        "CACHE_TYPE": "RedisCache",
+        "CACHE_REDIS_HOST": os.environ.get("REDIS_HOST", "localhost"),
+        "CACHE_REDIS_PORT": int(os.environ.get("REDIS_PORT", "6379")),
+        "CACHE_REDIS_USER": os.environ.get("REDIS_USER", ""),
+        "CACHE_REDIS_PASSWORD": os.environ.get("REDIS_PASSWORD", ""),
+        "CACHE_REDIS_DB": int(os.environ.get("REDIS_CELERY_DB", "0")),
+        "CACHE_REDIS_SSL": os.environ.get("REDIS_PROTO", "redis") == "rediss",
+    }
+    GLOBAL_ASYNC_QUERIES_REDIS_STREAM_PREFIX = (
+        f"{CHARTSGOUV_CACHE_KEY_PREFIX}-async-events-"
+    )
+    GLOBAL_ASYNC_QUERIES_JWT_SECRET = os.environ["CHARTSGOUV_ASYNC_QUERIES_JWT_SECRET"]
+    GLOBAL_ASYNC_QUERIES_JWT_COOKIE_SECURE = True
+    GLOBAL_ASYNC_QUERIES_TRANSPORT = os.environ.get(
+        "CHARTSGOUV_ASYNC_QUERIES_TRANSPORT", "polling"
+    )
+    GLOBAL_ASYNC_QUERIES_WEBSOCKET_URL = os.environ.get(
+        "CHARTSGOUV_ASYNC_QUERIES_WEBSOCKET_URL", ""
+    )
+
+    FEATURE_FLAGS["GLOBAL_ASYNC_QUERIES"] = True
+    FEATURE_FLAGS["SQLLAB_FORCE_RUN_ASYNC"] = True
+
 # ------------------------
 # HTML Sanitization
 # ------------------------
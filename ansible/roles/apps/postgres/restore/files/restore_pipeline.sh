@@ -0,0 +1,54 @@
+#!/bin/bash
+# Streaming restore pipeline: downloads and restores backups in parallel.
+#
+# Each dump found under the S3 prefix is downloaded, restored as soon as it
+# lands, then deleted, so at most <concurrency> dumps are on disk at once.
+# Custom-format dumps are restored with pg_restore --jobs; tar dumps with
+# pg_restore (no parallel restore for tar); plain SQL dumps with psql.
+#
+# Usage: restore_pipeline.sh <s3_prefix> <tmp_dir> <concurrency> <jobs>
+# Connection settings come from PGHOST, PGPORT, PGUSER, PGPASSWORD, PGDATABASE.
+
+set -euo pipefail
+
+source_prefix="$1"
+tmp_dir="$2"
+concurrency="$3"
+jobs="$4"
+
+# Restore a single dump: download, restore, delete
+restore_one() {
+    local object="$1"
+    local local_file
+    local start=$SECONDS
+    local_file="$(mktemp -p "$tmp_dir" "restore.XXXXXX")"
+    trap 'rm -f "$local_file"' RETURN
+
+    if ! mc cp --quiet "$object" "$local_file" >/dev/null; then
+        echo "FAILED download $object"
+        return 1
+    fi
+
+    local status=0
+    if [ "$(head -c 5 "$local_file")" = "PGDMP" ]; then
+        pg_restore --jobs "$jobs" --dbname "$PGDATABASE" "$local_file" || status=$?
+    elif [ "$(dd if="$local_file" bs=1 skip=257 count=5 2>/dev/null)" = "ustar" ]; then
+        pg_restore --format tar --dbname "$PGDATABASE" "$local_file" || status=$?
+    else
+        psql --quiet --set ON_ERROR_STOP=1 --file "$local_file" >/dev/null || status=$?
+    fi
+
+    if [ "$status" -ne 0 ]; then
+        echo "FAILED restore $object (exit $status)"
+        return 1
+    fi
+    echo "restored $object ($((SECONDS - start))s)"
+}
+export -f restore_one
+export tmp_dir jobs
+
+mkdir -p "$tmp_dir"
+
+mc find "$source_prefix" \
+    | { grep -E '\.(dump|sql|tar|backup)$' || true; } \
+    | xargs --no-run-if-empty -d '\n' -P "$concurrency" -I{} bash -c 'restore_one "$1"' _ {}
@@ -4,16 +4,51 @@ CLI pour gérer et exécuter les playbooks Ansible de façon simple et flexible.
 Supporte l'exécution parallèle et la découverte automatique des playbooks.
 """
 
+from __future__ import annotations
+
 import click
-import concurrent.futures
-import json
+import collections
 import os
-import subprocess
 import sys
-import yaml
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import List, Mapping, Tuple
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Set,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    import asyncio
+    import socket
+    import subprocess
+
+# Modules importés par les workers préchauffés (moteur inprocess): CLI, moteur
+# d'exécution et plugins intégrés utilisés par les playbooks du projet
+WARM_PRELOAD = (
+    "ansible.cli.playbook",
+    "ansible.executor.playbook_executor",
+    "ansible.executor.task_queue_manager",
+    "ansible.executor.process.worker",
+    "ansible.plugins.strategy.linear",
+    "ansible.plugins.strategy.free",
+    "ansible.plugins.callback.default",
+    "ansible.plugins.connection.local",
+    "ansible.plugins.action.normal",
+    "ansible.plugins.action.command",
+    "ansible.plugins.action.template",
+    "ansible.plugins.lookup.file",
+    "ansible.plugins.lookup.template",
+)
 
 
 class Colors:
@@ -30,9 +65,783 @@ class Colors:
     UNDERLINE = "\033[4m"
 
 
+class Status:
+    """Statuts possibles d'un playbook à l'issue d'une exécution"""
+
+    SUCCESS = "success"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    UNCHANGED = "unchanged"
+    CANCELLED = "cancelled"
+
+
+class TaskFailure(NamedTuple):
+    """Tâche Ansible en échec extraite de la sortie d'un playbook"""
+
+    task: str
+    host: str
+    message: str
+
+
+class FailureParser:
+    """
+    Extrait au fil de l'eau les tâches en échec de la sortie d'ansible-playbook
+
+    Le parseur reçoit la sortie ligne par ligne et retient le nom de la tâche
+    en cours ainsi que les blocs `fatal:` / `failed:` (hors tâches ignorées).
+    Sa mémoire est bornée: au plus MAX_FAILURES échecs, chaque bloc de
+    résultat étant limité à MAX_BLOCK_SIZE caractères.
+    """
+
+    MAX_FAILURES = 20
+    MAX_BLOCK_SIZE = 64 * 1024
+    MAX_MESSAGE_SIZE = 1024
+
+    def __init__(self):
+        import re
+
+        self._failure_re = re.compile(
+            r"^(?:fatal|failed): \[(?P<host>[^\]]+)\]:?(?P<detail>.*?) => (?P<body>.*)$"
+        )
+        self.task = ""
+        self.failures: List[TaskFailure] = []
+        self._pending: Tuple[str, str] | None = None
+        self._block: List[str] = []
+        self._block_size = 0
+        self._last_recorded = False
+
+    def feed(self, line: str) -> None:
+        """
+        Analyse une ligne de sortie
+
+        Args:
+            line: Ligne de la sortie standard d'ansible-playbook
+        """
+        line = line.rstrip("\n")
+
+        if self._pending:
+            if self._block_size < self.MAX_BLOCK_SIZE:
+                self._block.append(line)
+                self._block_size += len(line)
+            # Fin d'un résultat JSON multiligne (callback default avec -v...)
+            if line == "}" or self._block_size >= self.MAX_BLOCK_SIZE:
+                self._flush()
+            return
+
+        if line.startswith(("TASK [", "RUNNING HANDLER [")):
+            self.task = line[line.index("[") + 1 : line.rfind("]")]
+        elif line.strip() == "...ignoring" and self._last_recorded:
+            self.failures.pop()
+            self._last_recorded = False
+        else:
+            match = self._failure_re.match(line)
+            if match:
+                detail = match["detail"].replace("FAILED!", "").strip()
+                task = f"{self.task} {detail}".strip()
+                self._pending = (task, match["host"])
+                body = match["body"][: self.MAX_BLOCK_SIZE]
+                self._block, self._block_size = [body], len(body)
+                # Résultat complet sur une ligne (ou texte brut)
+                if not body.startswith("{") or body.rstrip().endswith("}"):
+                    self._flush()
+
+    def _flush(self) -> None:
+        """Enregistre l'échec en cours d'analyse"""
+        import json
+
+        task, host = self._pending
+        body = "\n".join(self._block)
+        self._pending, self._block, self._block_size = None, [], 0
+
+        try:
+            result = json.loads(body)
+        except ValueError:
+            result = None
+        if isinstance(result, dict):
+            message = result.get("msg") or result.get("stderr") or result.get("reason")
+            message = str(message or body)
+        else:
+            message = body
+
+        self._last_recorded = len(self.failures) < self.MAX_FAILURES
+        if self._last_recorded:
+            self.failures.append(
+                TaskFailure(task, host, message[: self.MAX_MESSAGE_SIZE])
+            )
+
+
+class EventCollector:
+    """
+    Consomme les événements JSON du callback cli_events (un par ligne)
+
+    Les événements sont recopiés dans un fichier (résultats exploitables par
+    machine, durées par tâche); seuls les échecs sont conservés en mémoire.
+    """
+
+    def __init__(
+        self,
+        log_file: IO[str],
+        on_task_start: Callable[[Dict], None] | None = None,
+    ):
+        """
+        Initialise le collecteur
+
+        Args:
+            log_file: Fichier recevant les événements bruts
+            on_task_start: Fonction appelée au démarrage de chaque tâche
+        """
+        self.log_file = log_file
+        self.on_task_start = on_task_start
+        self.tasks = 0
+        self.failures: List[TaskFailure] = []
+
+    @staticmethod
+    def task_label(event: Mapping) -> str:
+        """Nom d'une tâche préfixé par son rôle, comme dans la sortie d'Ansible"""
+        role = event.get("role")
+        return f"{role} : {event.get('task', '')}" if role else event.get("task", "")
+
+    def feed(self, line: str) -> None:
+        """
+        Traite un événement
+
+        Args:
+            line: Ligne JSON émise par le callback
+        """
+        import json
+
+        self.log_file.write(line if line.endswith("\n") else line + "\n")
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(event, dict):
+            return
+
+        kind = event.get("event")
+        if kind == "task_start":
+            self.tasks += 1
+            if self.on_task_start:
+                self.on_task_start(event)
+        elif kind in ("host_failed", "host_unreachable"):
+            if event.get("ignore_errors") or len(self.failures) >= (
+                FailureParser.MAX_FAILURES
+            ):
+                return
+            self.failures.append(
+                TaskFailure(
+                    self.task_label(event),
+                    str(event.get("host", "")),
+                    str(event.get("msg", ""))[: FailureParser.MAX_MESSAGE_SIZE],
+                )
+            )
+
+
+class PlaybookResult(NamedTuple):
+    """Résultat d'exécution d'un playbook
+
+    Les sorties du playbook ne sont pas conservées en mémoire: elles sont
+    écrites au fil de l'eau dans les fichiers stdout_log et stderr_log.
+    """
+
+    name: str
+    returncode: int
+    status: str
+    stdout_log: str = ""
+    stderr_log: str = ""
+    message: str = ""
+    duration: float = 0.0
+    failures: Tuple[TaskFailure, ...] = ()
+    events_log: str = ""
+    inventory: str = ""
+
+
+class ConnectionDemand(NamedTuple):
+    """Connexions Postgres ouvertes au pire par une application"""
+
+    app: str
+    host: str
+    database: str
+    user: str
+    connections: int
+    detail: str = ""
+
+
+class DependencyScheduler:
+    """
+    Ordonnanceur des playbooks selon leur graphe de dépendances (requires)
+
+    Un playbook devient prêt dès que toutes ses dépendances ont réussi.
+    Les dépendants (directs ou transitifs) d'un playbook en échec sont ignorés.
+    Parmi les noeuds prêts, ceux situés sur le chemin restant le plus long
+    (chemin critique) démarrent en premier. Les noeuds peuvent être répartis
+    en groupes (ex: un groupe par inventaire) dont le nombre de noeuds
+    simultanés est plafonné.
+    """
+
+    def __init__(
+        self,
+        ordered: List[Hashable],
+        requires: Mapping[Hashable, Iterable[Hashable]],
+        durations: Mapping[Hashable, float] | None = None,
+        groups: Mapping[Hashable, Hashable] | None = None,
+        group_limit: int | None = None,
+    ) -> None:
+        """
+        Initialise l'ordonnanceur
+
+        Args:
+            ordered: Noeuds à exécuter, dans l'ordre topologique
+            requires: Dépendances de chaque noeud
+            durations: Durée estimée de chaque noeud (en secondes)
+            groups: Groupe de chaque noeud
+            group_limit: Nombre maximal de noeuds simultanés par groupe
+        """
+        self.pending = list(ordered)
+        self.requires = {
+            node: [dep for dep in requires.get(node, []) if dep in ordered]
+            for node in ordered
+        }
+        self.running: Set[Hashable] = set()
+        self.succeeded: Set[Hashable] = set()
+        self.failed: Set[Hashable] = set()
+        self.priorities = self._critical_path(ordered, durations or {})
+        self.groups = groups or {}
+        self.group_limit = group_limit
+
+    def _critical_path(
+        self, ordered: List[Hashable], durations: Mapping[Hashable, float]
+    ) -> Dict[Hashable, float]:
+        """
+        Calcule, pour chaque noeud, la durée du plus long chemin restant
+
+        Args:
+            ordered: Noeuds dans l'ordre topologique
+            durations: Durée estimée de chaque noeud
+
+        Returns:
+            Dictionnaire noeud -> durée du chemin critique démarrant à ce noeud
+        """
+        dependents: Dict[Hashable, List[Hashable]] = {node: [] for node in ordered}
+        for node, deps in self.requires.items():
+            for dep in deps:
+                dependents[dep].append(node)
+
+        priorities: Dict[Hashable, float] = {}
+        for node in reversed(ordered):
+            priorities[node] = durations.get(node, 0.0) + max(
+                (priorities[child] for child in dependents[node]), default=0.0
+            )
+        return priorities
+
+    def next_ready(self, slots: int) -> List[Hashable]:
+        """
+        Retourne les prochains noeuds à démarrer et les marque en cours
+
+        Args:
+            slots: Nombre d'emplacements d'exécution libres
+
+        Returns:
+            Liste des noeuds prêts (au plus `slots`, dans la limite de leur groupe)
+        """
+        ready = sorted(
+            (
+                node
+                for node in self.pending
+                if all(dep in self.succeeded for dep in self.requires[node])
+            ),
+            key=lambda node: -self.priorities[node],
+        )
+
+        started: List[Hashable] = []
+        load = collections.Counter(self.groups.get(node) for node in self.running)
+        for node in ready:
+            if len(started) >= slots:
+                break
+            group = self.groups.get(node)
+            if self.group_limit and group is not None:
+                if load[group] >= self.group_limit:
+                    continue
+                load[group] += 1
+            self.pending.remove(node)
+            self.running.add(node)
+            started.append(node)
+
+        return started
+
+    def complete(self, node: Hashable, success: bool) -> None:
+        """
+        Enregistre la fin d'exécution d'un noeud
+
+        Un noeud encore en attente peut être terminé sans avoir été exécuté
+        (ex: playbook dont les entrées n'ont pas changé).
+
+        Args:
+            node: Noeud terminé
+            success: True si l'exécution a réussi
+        """
+        if node in self.pending:
+            self.pending.remove(node)
+        self.running.discard(node)
+        (self.succeeded if success else self.failed).add(node)
+
+    def pop_skipped(self) -> List[Tuple[Hashable, str]]:
+        """
+        Retire les noeuds qui ne pourront jamais être exécutés
+
+        Returns:
+            Liste de tuples (noeud, raison)
+        """
+        skipped = []
+        changed = True
+        while changed:
+            changed = False
+            for node in list(self.pending):
+                failed_deps = [dep for dep in self.requires[node] if dep in self.failed]
+                if failed_deps:
+                    self.pending.remove(node)
+                    self.failed.add(node)
+                    skipped.append(
+                        (
+                            node,
+                            f"dépendance en échec: {', '.join(map(str, failed_deps))}",
+                        )
+                    )
+                    changed = True
+
+        # Plus rien ne tourne mais des noeuds restent bloqués: dépendance circulaire
+        if not self.running and self.pending and not self._has_ready():
+            for node in self.pending:
+                self.failed.add(node)
+                skipped.append((node, "dépendance circulaire"))
+            self.pending = []
+
+        return skipped
+
+    def cancel(self) -> List[Hashable]:
+        """
+        Retire tous les noeuds en attente (arrêt anticipé après un échec)
+
+        Les noeuds en cours ne sont pas concernés: il appartient à l'appelant
+        de les arrêter, puis de les terminer avec complete().
+
+        Returns:
+            Liste des noeuds annulés
+        """
+        cancelled = self.pending
+        self.failed.update(cancelled)
+        self.pending = []
+        return cancelled
+
+    def _has_ready(self) -> bool:
+        """Indique si au moins un noeud en attente est prêt à démarrer"""
+        return any(
+            all(dep in self.succeeded for dep in self.requires[node])
+            for node in self.pending
+        )
+
+    @property
+    def finished(self) -> bool:
+        """True lorsque plus aucun noeud n'est en attente ni en cours"""
+        return not self.pending and not self.running
+
+
+class WarmProcess:
+    """
+    Processus ansible-playbook créé par un worker préchauffé
+
+    Expose le sous-ensemble de subprocess.Popen utilisé par le CLI (pid,
+    stdout, stderr, poll, wait). Le code retour est transmis par le worker sur
+    une socket propre au processus.
+    """
+
+    def __init__(self, pid: int, conn: socket.socket, stdout: IO, stderr: IO):
+        """
+        Initialise le processus
+
+        Args:
+            pid: Identifiant du processus (chef de son groupe)
+            conn: Socket sur laquelle le worker envoie le code retour
+            stdout: Sortie standard du processus
+            stderr: Sortie d'erreur du processus
+        """
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: int | None = None
+        self._exited = threading.Event()
+        threading.Thread(target=self._wait_exit, args=(conn,), daemon=True).start()
+
+    def _wait_exit(self, conn: socket.socket) -> None:
+        """Attend le code retour envoyé par le worker"""
+        with conn:
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(64)
+                if not chunk:
+                    break
+                data += chunk
+        # Worker arrêté avant la fin du processus: code retour inconnu
+        self.returncode = int(data) if data.endswith(b"\n") else 1
+        self._exited.set()
+
+    def poll(self) -> int | None:
+        """Retourne le code retour, ou None si le processus tourne encore"""
+        return self.returncode if self._exited.is_set() else None
+
+    def wait(self, timeout: float | None = None) -> int:
+        """
+        Attend la fin du processus
+
+        Args:
+            timeout: Délai maximal d'attente en secondes
+
+        Returns:
+            Code retour du processus
+
+        Raises:
+            subprocess.TimeoutExpired: Le processus tourne toujours après timeout
+        """
+        import subprocess
+
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired("ansible-playbook", timeout)
+        return self.returncode
+
+
+class WarmWorker:
+    """
+    Worker préchauffé: processus Python ayant déjà importé ansible-core
+
+    Chaque playbook est exécuté dans un fork du worker, ce qui évite le
+    démarrage de l'interpréteur et l'import d'Ansible et de ses plugins
+    intégrés. La configuration d'Ansible étant lue à l'import, un worker ne
+    sert que les playbooks lancés avec son environnement.
+    """
+
+    # Taille maximale d'une requête (commande et environnement sérialisés)
+    MAX_REQUEST_SIZE = 1024 * 1024
+
+    def __init__(self, env: Mapping[str, str], cwd: Path) -> None:
+        """
+        Démarre le worker et attend la fin de son préchauffage
+
+        Args:
+            env: Environnement du worker (configuration d'Ansible)
+            cwd: Répertoire de travail (emplacement d'ansible.cfg)
+
+        Raises:
+            RuntimeError: Le worker n'a pas pu importer Ansible
+        """
+        import socket
+        import subprocess
+
+        self._sock, remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._lock = threading.Lock()
+        with remote:
+            self.process = subprocess.Popen(
+                [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "warm-worker",
+                    str(remote.fileno()),
+                ],
+                cwd=cwd,
+                env=dict(env),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                pass_fds=(remote.fileno(),),
+                start_new_session=True,
+            )
+        status = self._sock.recv(self.MAX_REQUEST_SIZE)
+        if status != b"ready":
+            error = self.process.stderr.read().decode(errors="replace").strip()
+            self.close()
+            raise RuntimeError(
+                f"Worker préchauffé indisponible: {error.splitlines()[-1] if error else status.decode()}"  # noqa
+            )
+
+    def spawn(
+        self,
+        cmd: List[str],
+        cwd: Path,
+        env: Mapping[str, str],
+        pass_fds: Tuple[int, ...] = (),
+    ) -> WarmProcess:
+        """
+        Lance un playbook dans un fork du worker
+
+        Args:
+            cmd: Commande ansible-playbook
+            cwd: Répertoire de travail
+            env: Environnement du playbook
+            pass_fds: Descripteurs transmis au playbook, sous le même numéro
+
+        Returns:
+            Processus du playbook
+        """
+        import json
+        import socket
+
+        out_read, out_write = os.pipe()
+        err_read, err_write = os.pipe()
+        conn, remote = socket.socketpair()
+        request = {"argv": cmd, "cwd": str(cwd), "env": dict(env), "fds": pass_fds}
+        try:
+            with self._lock:
+                socket.send_fds(
+                    self._sock,
+                    [json.dumps(request).encode()],
+                    [remote.fileno(), out_write, err_write, *pass_fds],
+                )
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(64)
+                if not chunk:
+                    raise RuntimeError("Worker préchauffé arrêté")
+                data += chunk
+        except BaseException:
+            conn.close()
+            os.close(out_read)
+            os.close(err_read)
+            raise
+        finally:
+            remote.close()
+            os.close(out_write)
+            os.close(err_write)
+
+        return WarmProcess(
+            int(data),
+            conn,
+            open(out_read, "r", errors="replace"),
+            open(err_read, "r", errors="replace"),
+        )
+
+    def close(self) -> None:
+        """Arrête le worker (les playbooks en cours ne sont pas interrompus)"""
+        self._sock.close()
+        try:
+            self.process.wait(5)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+        self.process.stderr.close()
+
+
+class WarmWorkerPool:
+    """
+    Workers préchauffés, un par environnement d'exécution
+
+    Les variables de PER_PLAYBOOK_ENV sont lues par Ansible pendant
+    l'exécution (et non à l'import): elles peuvent varier d'un playbook à
+    l'autre sans nécessiter un worker distinct.
+    """
+
+    PER_PLAYBOOK_ENV = ("ANSIBLE_CLI_EVENTS_FD",)
+
+    def __init__(self, cwd: Path) -> None:
+        """
+        Initialise le pool (les workers sont démarrés à la demande)
+
+        Args:
+            cwd: Répertoire de travail des workers
+        """
+        self.cwd = cwd
+        self._workers: Dict[Tuple, WarmWorker] = {}
+        self._lock = threading.Lock()
+
+    def spawn(
+        self,
+        cmd: List[str],
+        cwd: Path,
+        env: Mapping[str, str],
+        pass_fds: Tuple[int, ...] = (),
+    ) -> WarmProcess:
+        """
+        Lance un playbook dans le worker correspondant à son environnement
+
+        Args:
+            cmd: Commande ansible-playbook
+            cwd: Répertoire de travail
+            env: Environnement du playbook
+            pass_fds: Descripteurs transmis au playbook
+
+        Returns:
+            Processus du playbook
+        """
+        worker_env = {
+            key: value for key, value in env.items() if key not in self.PER_PLAYBOOK_ENV
+        }
+        key = tuple(sorted(worker_env.items()))
+        with self._lock:
+            if key not in self._workers:
+                self._workers[key] = WarmWorker(worker_env, self.cwd)
+            worker = self._workers[key]
+        return worker.spawn(cmd, cwd, env, pass_fds)
+
+    def close(self) -> None:
+        """Arrête tous les workers"""
+        with self._lock:
+            for worker in self._workers.values():
+                worker.close()
+            self._workers.clear()
+
+
+def serve_warm_worker(fd: int) -> None:
+    """
+    Boucle d'un worker préchauffé
+
+    Importe ansible-core et ses plugins intégrés, signale qu'il est prêt puis
+    exécute chaque requête reçue dans un fork, jusqu'à la fermeture de la
+    socket par le CLI. Pour chaque playbook, le pid puis le code retour sont
+    envoyés sur la socket transmise avec la requête.
+
+    Args:
+        fd: Descripteur de la socket de contrôle
+    """
+    import importlib
+    import json
+    import socket
+    import traceback
+
+    sock = socket.socket(fileno=fd)
+    try:
+        for module in WARM_PRELOAD:
+            importlib.import_module(module)
+    except BaseException:
+        traceback.print_exc()
+        sock.send(b"error")
+        return
+    sock.send(b"ready")
+
+    def report_exit(pid: int, conn: socket.socket) -> None:
+        _, status = os.waitpid(pid, 0)
+        with conn:
+            conn.sendall(f"{os.waitstatus_to_exitcode(status)}\n".encode())
+
+    while True:
+        message, fds, _, _ = socket.recv_fds(sock, WarmWorker.MAX_REQUEST_SIZE, 16)
+        if not message:
+            break
+        request = json.loads(message)
+        conn_fd, *io_fds = fds
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            os.close(conn_fd)
+            _run_forked_playbook(request, io_fds)
+
+        for io_fd in io_fds:
+            os.close(io_fd)
+        try:
+            # Également fait par l'enfant: le groupe existe avant l'envoi du pid
+            os.setpgid(pid, pid)
+        except OSError:
+            pass
+        conn = socket.socket(fileno=conn_fd)
+        conn.sendall(f"{pid}\n".encode())
+        threading.Thread(target=report_exit, args=(pid, conn), daemon=True).start()
+
+
+def _run_forked_playbook(request: Mapping, fds: List[int]) -> None:
+    """
+    Exécute ansible-playbook dans le fork d'un worker préchauffé (ne rend
+    jamais la main)
+
+    Args:
+        request: Commande, répertoire et environnement du playbook
+        fds: Descripteurs reçus (stdout, stderr puis ceux de request["fds"])
+    """
+    import fcntl
+
+    code = 1
+    try:
+        os.setpgid(0, 0)
+        # Descripteurs déplacés au-delà des numéros cibles avant d'être remis
+        # en place (stdout, stderr puis numéros d'origine); l'entrée standard
+        # du worker est déjà /dev/null. Tous les autres sont fermés.
+        targets = [1, 2, *request["fds"]]
+        high = max(targets + fds) + 1
+        moved = [fcntl.fcntl(fd, fcntl.F_DUPFD, high) for fd in fds]
+        for fd in fds:
+            os.close(fd)
+        for source, target in zip(moved, targets):
+            os.dup2(source, target)
+        start = 3
+        for fd in sorted(set(targets[2:])):
+            os.closerange(start, fd)
+            start = fd + 1
+        os.closerange(start, os.sysconf("SC_OPEN_MAX"))
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.argv = list(request["argv"])
+
+        from ansible.cli.playbook import main
+
+        try:
+            main(sys.argv)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
 class AnsibleCLI:
     """Classe principale pour gérer l'exécution des playbooks Ansible"""
 
+    # Nombre d'exécutions récentes prises en compte pour estimer une durée
+    HISTORY_SAMPLES = 10
+    # Nombre de répertoires de logs d'exécution conservés
+    LOG_RUNS_KEPT = 20
+    # Taille maximale (caractères) d'une ligne lue sur la sortie d'un playbook
+    LINE_MAX_SIZE = 64 * 1024
+    # Nombre de lignes de stderr affichées pour un échec dans le résumé
+    SUMMARY_TAIL_LINES = 20
+    # Délai (secondes) laissé à un playbook après SIGTERM avant SIGKILL
+    TERMINATE_GRACE_PERIOD = 10
+    # Moteurs d'exécution disponibles pour run_playbooks
+    ENGINES = ("thread", "asyncio", "inprocess")
+    # Durée de validité par défaut d'un index de dépôt Helm rafraîchi (secondes)
+    HELM_REPO_TTL = 600
+    # Début des lignes d'état des releases Helm dans la sortie d'ansible
+    RELEASE_MARKER = '"msg": "helm release '
+    # Délai de lecture des derniers événements après la fin d'un playbook
+    EVENTS_DRAIN_TIMEOUT = 2
+    # Profils de réglage d'ansible-playbook (voir _perf_env)
+    PERF_PROFILES = ("default", "fast")
+    # Nombre maximal de forks du profil fast
+    PERF_MAX_FORKS = 50
+    # Durée de validité des faits en cache (secondes)
+    FACT_CACHE_TIMEOUT = 3600
+    # max_connections par défaut de Postgres, et connexions réservées au
+    # superutilisateur (superuser_reserved_connections)
+    PG_MAX_CONNECTIONS = 100
+    PG_RESERVED_CONNECTIONS = 3
+    # Rôle déployant les releases Postgres partagées
+    POSTGRES_ROLE = "apps/postgres/service"
+    # Rôles applicatifs -> méthode estimant leur demande de connexions Postgres
+    CONNECTION_ROLES = {
+        "apps/airflow": "_airflow_connections",
+        "apps/chartsgouv": "_superset_connections",
+        "apps/n8n": "_n8n_connections",
+        "apps/polaris": "_polaris_connections",
+    }
+
     def __init__(self, base_dir: str | None = None) -> None:
         """
         Initialise le CLI
@@ -43,15 +852,108 @@ class AnsibleCLI:
         self.base_dir = Path(base_dir or os.path.dirname(os.path.abspath(__file__)))
         self.playbooks_dir = self.base_dir / "ansible" / "playbooks"
         self.config_file = self.base_dir / "ansible" / "playbooks.yaml"
-        self.playbooks = self._discover_playbooks()
+        self.state_dir = self.base_dir / ".ansible_cli"
+        self.history_file = self.state_dir / "history.jsonl"
+        self.logs_dir = self.state_dir / "logs"
+        self.index_file = self.state_dir / "playbooks_index.json"
+        self.deployed_file = self.state_dir / "deployed.json"
+        self.helm_values_dir = self.state_dir / "helm_values"
+        self.helm_repos_file = self.state_dir / "helm_repos.json"
+        self.callback_plugins_dir = self.base_dir / "ansible" / "callback_plugins"
+        self.facts_cache_dir = self.state_dir / "facts"
+        self.roles_dirs = [
+            self.playbooks_dir / "roles",
+            self.base_dir / "ansible" / "roles",
+        ]
+        self._output_lock = threading.Lock()
+        self._processes: Dict[str, subprocess.Popen] = {}
+        # Playbooks à arrêter dès leur lancement (--fail-fast)
+        self._stopping: Set[str] = set()
+        self._playbooks: Mapping[str, Mapping] | None = None
+
+    @property
+    def playbooks(self) -> Mapping[str, Mapping]:
+        """Playbooks disponibles, découverts au premier accès"""
+        if self._playbooks is None:
+            self._playbooks = self._discover_playbooks()
+        return self._playbooks
 
     def _discover_playbooks(self) -> Mapping[str, Mapping]:
         """
         Découvre automatiquement les playbooks disponibles
 
+        Le résultat est conservé dans un index (index_file), reconstruit
+        uniquement lorsque playbooks.yaml ou le répertoire des playbooks
+        change (date de modification ou taille).
+
         Returns:
             Dictionnaire des playbooks avec leurs métadonnées
         """
+        import json
+
+        signature = self._discovery_signature()
+
+        try:
+            with open(self.index_file, "r") as f:
+                index = json.load(f)
+            if index.get("signature") == signature:
+                return index["playbooks"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+        playbooks = self._scan_playbooks()
+
+        try:
+            self._write_json(
+                self.index_file, {"signature": signature, "playbooks": playbooks}
+            )
+        except OSError:
+            pass
+
+        return playbooks
+
+    def _write_json(self, path: Path, data: Mapping) -> None:
+        """
+        Écrit un fichier JSON de façon atomique (fichier temporaire + renommage)
+
+        Args:
+            path: Fichier de destination
+            data: Données à sérialiser
+        """
+        import json
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, path)
+
+    def _discovery_signature(self) -> List[List[int] | None]:
+        """
+        Calcule la signature des sources de la découverte des playbooks
+
+        Returns:
+            Liste [mtime_ns, taille] pour playbooks.yaml et le répertoire des
+            playbooks (None si absent)
+        """
+        signature = []
+        for path in (self.config_file, self.playbooks_dir):
+            try:
+                stat = path.stat()
+                signature.append([stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def _scan_playbooks(self) -> Mapping[str, Mapping]:
+        """
+        Scanne le répertoire des playbooks et lit leurs métadonnées
+
+        Returns:
+            Dictionnaire des playbooks avec leurs métadonnées, trié par ordre
+        """
+        import yaml
+
         playbooks = {}
 
         # Charger la config si elle existe
@@ -59,26 +961,21 @@ class AnsibleCLI:
         if self.config_file.exists():
             with open(self.config_file, "r") as f:
                 config = yaml.safe_load(f) or {}
+        playbooks_config = config.get("playbooks") or {}
 
         # Scanner tous les fichiers .yaml/.yml dans le répertoire playbooks
         if self.playbooks_dir.exists():
             for pattern in ["*.yaml", "*.yml"]:
                 for pb_path in self.playbooks_dir.glob(pattern):
                     name = pb_path.stem
+                    meta = playbooks_config.get(name) or {}
                     playbooks[name] = {
                         "path": str(pb_path.relative_to(self.base_dir)),
-                        "description": config.get("playbooks", {})
-                        .get(name, {})
-                        .get("description", ""),
-                        "tags": config.get("playbooks", {})
-                        .get(name, {})
-                        .get("tags", []),
-                        "requires": config.get("playbooks", {})
-                        .get(name, {})
-                        .get("requires", []),
-                        "order": config.get("playbooks", {})
-                        .get(name, {})
-                        .get("order", 999),
+                        "description": meta.get("description", ""),
+                        "tags": meta.get("tags", []),
+                        "requires": meta.get("requires", []),
+                        "order": meta.get("order", 999),
+                        "strategy": meta.get("strategy", ""),
                     }
 
         return dict(sorted(playbooks.items(), key=lambda x: x[1]["order"]))
@@ -109,155 +1006,2559 @@ class AnsibleCLI:
                     print(f"  Dépendances: {', '.join(info['requires'])}")
             print()
 
-    def duplicate_example_files(self) -> None:
-        """Duplique les fichiers example.main.yaml vers main.yaml"""
-        print(f"{Colors.OKCYAN}Duplication des fichiers d'exemple...{Colors.ENDC}")
+    def duplicate_example_files(self) -> None:
+        """Duplique les fichiers example.main.yaml vers main.yaml"""
+        import shutil
+
+        print(f"{Colors.OKCYAN}Duplication des fichiers d'exemple...{Colors.ENDC}")
+
+        count = 0
+        for example_file in self.base_dir.rglob("example.main.yaml"):
+            target = example_file.parent / "main.yaml"
+            if not target.exists():
+                shutil.copy2(example_file, target)
+                print(
+                    f"{Colors.OKGREEN}✓{Colors.ENDC} Créé: {target.relative_to(self.base_dir)}"
+                )
+                count += 1
+            else:
+                print(
+                    f"{Colors.WARNING}→{Colors.ENDC} Existe déjà: {target.relative_to(self.base_dir)}"  # noqa
+                )
+
+        print(f"\n{Colors.OKGREEN}{count} fichier(s) créé(s){Colors.ENDC}\n")
+
+    def _build_command(
+        self,
+        playbook_name: str,
+        inventory: str = "localhost",
+        extra_vars: Mapping | None = None,
+        tags: List[str] | None = None,
+        skip_tags: List[str] | None = None,
+        dry_run: bool = False,
+        verbose: int = 0,
+        values_cache: bool = True,
+        helm_repos_refreshed: List[str] | None = None,
+    ) -> List[str]:
+        """
+        Construit la ligne de commande ansible-playbook d'un playbook
+
+        Args:
+            playbook_name: Nom du playbook
+            inventory: Fichier d'inventaire ou hôte
+            extra_vars: Variables supplémentaires
+            tags: Tags à exécuter
+            skip_tags: Tags à ignorer
+            dry_run: Mode simulation (--check)
+            verbose: Niveau de verbosité (0-3)
+            values_cache: Transmet le répertoire du cache des values Helm
+                (les rôles sautent l'upgrade Helm si les values n'ont pas changé)
+            helm_repos_refreshed: Noms des dépôts Helm déjà rafraîchis par le
+                pré-vol (les rôles sautent alors leur helm_repository)
+
+        Returns:
+            Liste des arguments de la commande
+        """
+        import json
+
+        playbook_path = self.base_dir / self.playbooks[playbook_name]["path"]
+
+        cmd = ["ansible-playbook", "-i", inventory, str(playbook_path)]
+
+        if dry_run:
+            cmd.append("--check")
+
+        if verbose > 0:
+            cmd.append("-" + "v" * min(verbose, 4))
+
+        # Avant les extra-vars utilisateur pour qu'elles puissent le surcharger
+        cli_vars = {}
+        if values_cache and not dry_run:
+            cli_vars["helm_values_cache_dir"] = str(self._helm_values_dir(inventory))
+        if helm_repos_refreshed:
+            cli_vars["helm_repos_refreshed"] = helm_repos_refreshed
+        if cli_vars:
+            cmd.extend(["--extra-vars", json.dumps(cli_vars)])
+
+        if extra_vars:
+            cmd.extend(["--extra-vars", json.dumps(extra_vars)])
+
+        if tags:
+            cmd.extend(["--tags", ",".join(tags)])
+
+        if skip_tags:
+            cmd.extend(["--skip-tags", ",".join(skip_tags)])
+
+        return cmd
+
+    def _helm_values_dir(self, inventory: str) -> Path:
+        """
+        Répertoire du cache des values Helm d'un inventaire
+
+        Les entrées du cache ne contiennent pas le cluster (namespace et
+        release seulement): chaque inventaire a donc son propre répertoire,
+        nommé d'après son chemin pour rester stable d'une exécution à l'autre.
+
+        Args:
+            inventory: Fichier d'inventaire ou hôte
+
+        Returns:
+            Répertoire du cache
+        """
+        import re
+
+        name = re.sub(r"[^\w.-]+", "_", inventory.strip("/")) or "_"
+        return self.helm_values_dir / name
+
+    def _run_playbook(
+        self,
+        playbook_name: str,
+        stream: bool = False,
+        log_dir: Path | None = None,
+        timeout: float | None = None,
+        progress: bool = False,
+        label: str | None = None,
+        perf_profile: str = "default",
+        warm_pool: WarmWorkerPool | None = None,
+        **kwargs,
+    ) -> PlaybookResult:
+        """
+        Exécute un playbook Ansible
+
+        Les sorties standard et d'erreur sont lues ligne par ligne pendant
+        l'exécution et écrites dans des fichiers de log, afin de garder une
+        empreinte mémoire bornée quelle que soit la verbosité d'Ansible. Les
+        événements JSON du callback cli_events sont lus sur un tube dédié.
+
+        Args:
+            playbook_name: Nom du playbook
+            stream: Affiche la sortie en temps réel, préfixée par [playbook]
+            log_dir: Répertoire des logs de l'exécution (créé si absent)
+            timeout: Durée maximale d'exécution en secondes (None ou 0: sans
+                limite)
+            progress: Affiche le démarrage de chaque tâche
+            label: Nom affiché et utilisé pour les logs (défaut: nom du playbook,
+                suffixé par l'inventaire lors d'un déploiement multi-inventaires)
+            perf_profile: Profil de réglage d'ansible-playbook (voir _perf_env)
+            warm_pool: Workers préchauffés dans lesquels lancer le playbook
+                (moteur inprocess); à défaut, un processus ansible-playbook
+            **kwargs: Arguments passés à _build_command
+
+        Returns:
+            Résultat de l'exécution
+        """
+        import subprocess
+
+        if playbook_name not in self.playbooks:
+            return PlaybookResult(
+                playbook_name,
+                1,
+                Status.FAILED,
+                message=f"Playbook '{playbook_name}' non trouvé",
+            )
+
+        label = label or playbook_name
+        cmd = self._build_command(playbook_name, **kwargs)
+        stdout_log, stderr_log, events_log = self._log_paths(label, log_dir)
+
+        start_time = self._report_start(label)
+        timed_out = threading.Event()
+        parser = FailureParser()
+
+        try:
+            with open(stdout_log, "w") as out, open(stderr_log, "w") as err, open(
+                events_log, "w"
+            ) as events:
+                collector = self._event_collector(events, label, progress)
+                events_read, events_write = os.pipe()
+                env = {
+                    **self._perf_env(playbook_name, perf_profile),
+                    **self._events_env(events_write),
+                }
+                try:
+                    if warm_pool is not None:
+                        process = warm_pool.spawn(
+                            cmd, self.base_dir, env, (events_write,)
+                        )
+                    else:
+                        process = subprocess.Popen(
+                            cmd,
+                            cwd=self.base_dir,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            text=True,
+                            errors="replace",
+                            start_new_session=True,
+                            env=env,
+                            pass_fds=(events_write,),
+                        )
+                except Exception:
+                    os.close(events_read)
+                    raise
+                finally:
+                    os.close(events_write)
+                self._processes[label] = process
+                if label in self._stopping:
+                    threading.Thread(
+                        target=self._terminate_process, args=(process,), daemon=True
+                    ).start()
+                timer = None
+                if timeout:
+                    timer = threading.Timer(
+                        timeout,
+                        lambda: (timed_out.set(), self._terminate_process(process)),
+                    )
+                    timer.start()
+
+                stderr_reader = threading.Thread(
+                    target=self._pump_output,
+                    args=(process.stderr, err, label, stream, True),
+                    daemon=True,
+                )
+                stderr_reader.start()
+                events_reader = threading.Thread(
+                    target=self._pump_events,
+                    args=(events_read, collector),
+                    daemon=True,
+                )
+                events_reader.start()
+                self._pump_output(process.stdout, out, label, stream, False, parser)
+                stderr_reader.join()
+                returncode = process.wait()
+                events_reader.join(self.EVENTS_DRAIN_TIMEOUT)
+                self._processes.pop(label, None)
+                if timer:
+                    timer.cancel()
+
+            message = f"Délai dépassé ({timeout:g}s)" if timed_out.is_set() else ""
+            return self._report_end(
+                label,
+                returncode,
+                start_time,
+                stdout_log,
+                stderr_log,
+                message,
+                collector.failures if collector.tasks else parser.failures,
+                events_log,
+            )
+
+        except Exception as e:
+            return self._report_error(label, e, start_time, stdout_log, stderr_log)
+
+    async def _run_playbook_async(
+        self,
+        playbook_name: str,
+        stream: bool = False,
+        log_dir: Path | None = None,
+        timeout: float | None = None,
+        progress: bool = False,
+        label: str | None = None,
+        perf_profile: str = "default",
+        **kwargs,
+    ) -> PlaybookResult:
+        """
+        Exécute un playbook Ansible depuis la boucle asyncio
+
+        Équivalent de _run_playbook sans thread dédié: les sorties du processus
+        sont multiplexées par la boucle d'événements. En cas d'annulation
+        (Ctrl-C), le groupe de processus du playbook est arrêté proprement.
+
+        Args:
+            playbook_name: Nom du playbook
+            stream: Affiche la sortie en temps réel, préfixée par [playbook]
+            log_dir: Répertoire des logs de l'exécution (créé si absent)
+            timeout: Durée maximale d'exécution en secondes (None ou 0: sans
+                limite)
+            progress: Affiche le démarrage de chaque tâche
+            label: Nom affiché et utilisé pour les logs (défaut: nom du playbook,
+                suffixé par l'inventaire lors d'un déploiement multi-inventaires)
+            perf_profile: Profil de réglage d'ansible-playbook (voir _perf_env)
+            **kwargs: Arguments passés à _build_command
+
+        Returns:
+            Résultat de l'exécution
+        """
+        import asyncio
+
+        if playbook_name not in self.playbooks:
+            return PlaybookResult(
+                playbook_name,
+                1,
+                Status.FAILED,
+                message=f"Playbook '{playbook_name}' non trouvé",
+            )
+
+        label = label or playbook_name
+        cmd = self._build_command(playbook_name, **kwargs)
+        stdout_log, stderr_log, events_log = self._log_paths(label, log_dir)
+
+        start_time = self._report_start(label)
+        message = ""
+        parser = FailureParser()
+
+        try:
+            with open(stdout_log, "w") as out, open(stderr_log, "w") as err, open(
+                events_log, "w"
+            ) as events:
+                collector = self._event_collector(events, label, progress)
+                events_read, events_write = os.pipe()
+                env = {
+                    **self._perf_env(playbook_name, perf_profile),
+                    **self._events_env(events_write),
+                }
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        cwd=self.base_dir,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                        start_new_session=True,
+                        env=env,
+                        pass_fds=(events_write,),
+                    )
+                except BaseException:
+                    os.close(events_read)
+                    raise
+                finally:
+                    os.close(events_write)
+                self._processes[label] = process
+                if label in self._stopping:
+                    await self._terminate_process_async(process)
+                events_task = asyncio.ensure_future(
+                    self._pump_events_async(events_read, collector)
+                )
+                supervision = asyncio.gather(
+                    self._pump_output_async(
+                        process.stdout, out, label, stream, False, parser
+                    ),
+                    self._pump_output_async(process.stderr, err, label, stream, True),
+                    process.wait(),
+                )
+                try:
+                    await asyncio.wait_for(asyncio.shield(supervision), timeout or None)
+                except asyncio.TimeoutError:
+                    message = f"Délai dépassé ({timeout:g}s)"
+                    await self._terminate_process_async(process)
+                    await supervision
+                except asyncio.CancelledError:
+                    await self._terminate_process_async(process)
+                    await supervision
+                    events_task.cancel()
+                    raise
+                finally:
+                    self._processes.pop(label, None)
+                    await asyncio.wait({events_task}, timeout=self.EVENTS_DRAIN_TIMEOUT)
+                    events_task.cancel()
+
+            return self._report_end(
+                label,
+                process.returncode,
+                start_time,
+                stdout_log,
+                stderr_log,
+                message,
+                collector.failures if collector.tasks else parser.failures,
+                events_log,
+            )
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            return self._report_error(label, e, start_time, stdout_log, stderr_log)
+
+    def _log_paths(
+        self, playbook_name: str, log_dir: Path | None
+    ) -> Tuple[Path, Path, Path]:
+        """
+        Retourne les fichiers de log (stdout, stderr, événements) d'un playbook
+
+        Args:
+            playbook_name: Nom du playbook
+            log_dir: Répertoire des logs de l'exécution (créé si absent)
+
+        Returns:
+            Tuple (stdout_log, stderr_log, events_log)
+        """
+        log_dir = log_dir or self._new_log_dir()
+        log_dir.mkdir(parents=True, exist_ok=True)
+        return (
+            log_dir / f"{playbook_name}.log",
+            log_dir / f"{playbook_name}.err.log",
+            log_dir / f"{playbook_name}.events.jsonl",
+        )
+
+    def _events_env(self, fd: int) -> Dict[str, str]:
+        """
+        Construit l'environnement activant le callback cli_events
+
+        Args:
+            fd: Descripteur du tube sur lequel le callback écrit ses événements
+
+        Returns:
+            Variables d'environnement du processus ansible-playbook
+        """
+        env = dict(os.environ)
+        plugins = [str(self.callback_plugins_dir), env.get("ANSIBLE_CALLBACK_PLUGINS")]
+        env["ANSIBLE_CALLBACK_PLUGINS"] = os.pathsep.join(p for p in plugins if p)
+        enabled = [c for c in env.get("ANSIBLE_CALLBACKS_ENABLED", "").split(",") if c]
+        env["ANSIBLE_CALLBACKS_ENABLED"] = ",".join(enabled + ["cli_events"])
+        env["ANSIBLE_CLI_EVENTS_FD"] = str(fd)
+        return env
+
+    def _perf_env(self, playbook_name: str, profile: str) -> Dict[str, str]:
+        """
+        Construit les variables d'environnement d'un profil de réglage
+
+        Le profil fast active le pipelining (un seul aller-retour par module),
+        un cache de faits jsonfile partagé entre les exécutions (faits collectés
+        seulement s'ils sont absents du cache) et un nombre de forks adapté à la
+        machine. La stratégie free n'est appliquée qu'aux playbooks qui la
+        déclarent (`strategy: free` dans playbooks.yaml). Les variables déjà
+        définies dans l'environnement restent prioritaires.
+
+        Args:
+            playbook_name: Nom du playbook
+            profile: Profil de réglage (PERF_PROFILES)
+
+        Returns:
+            Variables d'environnement du profil
+        """
+        if profile != "fast":
+            return {}
+
+        env = {
+            "ANSIBLE_PIPELINING": "True",
+            "ANSIBLE_FORKS": str(min(self.PERF_MAX_FORKS, 4 * (os.cpu_count() or 1))),
+            "ANSIBLE_GATHERING": "smart",
+            "ANSIBLE_CACHE_PLUGIN": "jsonfile",
+            "ANSIBLE_CACHE_PLUGIN_CONNECTION": str(self.facts_cache_dir),
+            "ANSIBLE_CACHE_PLUGIN_TIMEOUT": str(self.FACT_CACHE_TIMEOUT),
+        }
+        if self.playbooks.get(playbook_name, {}).get("strategy") == "free":
+            env["ANSIBLE_STRATEGY"] = "free"
+        return env
+
+    def _event_collector(
+        self, log_file: IO[str], playbook_name: str, progress: bool
+    ) -> EventCollector:
+        """
+        Crée le collecteur d'événements d'un playbook
+
+        Args:
+            log_file: Fichier recevant les événements
+            playbook_name: Nom du playbook
+            progress: Affiche le démarrage de chaque tâche
+
+        Returns:
+            Collecteur d'événements
+        """
+
+        def on_task_start(event: Dict) -> None:
+            label = EventCollector.task_label(event)
+            self._echo(f"{Colors.OKBLUE}[{playbook_name}] ▸ {label}{Colors.ENDC}")
+
+        return EventCollector(log_file, on_task_start if progress else None)
+
+    def _pump_events(self, fd: int, collector: EventCollector) -> None:
+        """
+        Lit les événements du callback cli_events jusqu'à la fermeture du tube
+
+        Args:
+            fd: Extrémité en lecture du tube
+            collector: Collecteur des événements
+        """
+        with open(fd, "r", errors="replace") as pipe:
+            for line in iter(lambda: pipe.readline(self.LINE_MAX_SIZE), ""):
+                collector.feed(line)
+
+    async def _pump_events_async(self, fd: int, collector: EventCollector) -> None:
+        """
+        Lit les événements du callback cli_events (moteur asyncio)
+
+        Args:
+            fd: Extrémité en lecture du tube
+            collector: Collecteur des événements
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=self.LINE_MAX_SIZE)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), open(fd, "rb")
+        )
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Événement plus long que LINE_MAX_SIZE: ignoré
+                    continue
+                if not line:
+                    break
+                collector.feed(line.decode(errors="replace"))
+        finally:
+            transport.close()
+
+    def _report_start(self, playbook_name: str) -> datetime:
+        """
+        Affiche le démarrage d'un playbook
+
+        Args:
+            playbook_name: Nom du playbook
+
+        Returns:
+            Date de démarrage
+        """
+        start_time = datetime.now()
+        self._echo(
+            f"{Colors.OKCYAN}[{start_time.strftime('%H:%M:%S')}] Démarrage: {playbook_name}{Colors.ENDC}"  # noqa
+        )
+        return start_time
+
+    def _report_end(
+        self,
+        playbook_name: str,
+        returncode: int,
+        start_time: datetime,
+        stdout_log: Path,
+        stderr_log: Path,
+        message: str = "",
+        failures: List[TaskFailure] | None = None,
+        events_log: Path | None = None,
+    ) -> PlaybookResult:
+        """
+        Affiche la fin d'un playbook et construit son résultat
+
+        Args:
+            playbook_name: Nom du playbook
+            returncode: Code de retour d'ansible-playbook
+            start_time: Date de démarrage
+            stdout_log: Fichier de log de la sortie standard
+            stderr_log: Fichier de log de la sortie d'erreur
+            message: Message complémentaire (ex: délai dépassé)
+            failures: Tâches en échec extraites de la sortie
+            events_log: Fichier des événements JSON du playbook
+
+        Returns:
+            Résultat de l'exécution
+        """
+        end_time = datetime.now()
+        duration = (end_time - start_time).total_seconds()
+
+        if returncode == 0:
+            self._echo(
+                f"{Colors.OKGREEN}[{end_time.strftime('%H:%M:%S')}] ✓ Succès: {playbook_name} ({duration:.1f}s){Colors.ENDC}"  # noqa
+            )
+        else:
+            self._echo(
+                f"{Colors.FAIL}[{end_time.strftime('%H:%M:%S')}] ✗ Échec: {playbook_name} ({duration:.1f}s){Colors.ENDC}"  # noqa
+            )
+
+        return PlaybookResult(
+            playbook_name,
+            returncode,
+            Status.SUCCESS if returncode == 0 else Status.FAILED,
+            str(stdout_log),
+            str(stderr_log),
+            message=message,
+            duration=duration,
+            failures=tuple(failures or ()),
+            events_log=str(events_log or ""),
+        )
+
+    def _report_error(
+        self,
+        playbook_name: str,
+        error: Exception,
+        start_time: datetime,
+        stdout_log: Path,
+        stderr_log: Path,
+    ) -> PlaybookResult:
+        """
+        Affiche l'erreur de lancement d'un playbook et construit son résultat
+
+        Args:
+            playbook_name: Nom du playbook
+            error: Exception levée
+            start_time: Date de démarrage
+            stdout_log: Fichier de log de la sortie standard
+            stderr_log: Fichier de log de la sortie d'erreur
+
+        Returns:
+            Résultat de l'exécution
+        """
+        end_time = datetime.now()
+        self._echo(
+            f"{Colors.FAIL}[{end_time.strftime('%H:%M:%S')}] ✗ Erreur: {playbook_name} - {str(error)}{Colors.ENDC}"  # noqa
+        )
+        return PlaybookResult(
+            playbook_name,
+            1,
+            Status.FAILED,
+            str(stdout_log),
+            str(stderr_log),
+            message=str(error),
+            duration=(end_time - start_time).total_seconds(),
+        )
+
+    def _terminate_process(self, process: subprocess.Popen) -> None:
+        """
+        Arrête le groupe de processus d'un playbook: SIGTERM, puis SIGKILL
+        après TERMINATE_GRACE_PERIOD
+
+        Args:
+            process: Processus ansible-playbook (chef de son groupe)
+        """
+        import signal
+        import subprocess
+
+        if process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(self.TERMINATE_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def _terminate_process_async(
+        self, process: asyncio.subprocess.Process
+    ) -> None:
+        """
+        Arrête le groupe de processus d'un playbook lancé par la boucle asyncio
+
+        Args:
+            process: Processus ansible-playbook (chef de son groupe)
+        """
+        import asyncio
+        import signal
+
+        if process.returncode is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            await asyncio.wait_for(process.wait(), self.TERMINATE_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _pump_output(
+        self,
+        pipe: IO[str],
+        log_file: IO[str],
+        prefix: str,
+        echo: bool,
+        error: bool,
+        parser: FailureParser | None = None,
+    ) -> None:
+        """
+        Recopie une sortie de playbook ligne par ligne dans son fichier de log
+
+        Args:
+            pipe: Flux de sortie du processus
+            log_file: Fichier de log de destination
+            prefix: Préfixe affiché devant chaque ligne ([playbook])
+            echo: Affiche également chaque ligne sur le terminal
+            error: Flux d'erreur (affiché en rouge)
+            parser: Parseur des tâches en échec alimenté avec chaque ligne
+        """
+        for line in iter(lambda: pipe.readline(self.LINE_MAX_SIZE), ""):
+            log_file.write(line)
+            if parser:
+                parser.feed(line)
+            self._forward_line(line, prefix, echo, error)
+        log_file.flush()
+
+    async def _pump_output_async(
+        self,
+        reader: asyncio.StreamReader,
+        log_file: IO[str],
+        prefix: str,
+        echo: bool,
+        error: bool,
+        parser: FailureParser | None = None,
+    ) -> None:
+        """
+        Recopie une sortie de playbook dans son fichier de log (moteur asyncio)
+
+        Les lignes plus longues que LINE_MAX_SIZE sont découpées.
+
+        Args:
+            reader: Flux de sortie du processus
+            log_file: Fichier de log de destination
+            prefix: Préfixe affiché devant chaque ligne ([playbook])
+            echo: Affiche également chaque ligne sur le terminal
+            error: Flux d'erreur (affiché en rouge)
+            parser: Parseur des tâches en échec alimenté avec chaque ligne
+        """
+        pending = b""
+        while True:
+            chunk = await reader.read(self.LINE_MAX_SIZE)
+            pending += chunk
+            lines = pending.split(b"\n")
+            pending = lines.pop() if chunk else b""
+            if len(pending) >= self.LINE_MAX_SIZE:
+                lines.append(pending)
+                pending = b""
+
+            for raw in lines:
+                if not raw and not chunk:
+                    continue
+                line = raw.decode(errors="replace")
+                log_file.write(line + "\n")
+                if parser:
+                    parser.feed(line)
+                self._forward_line(line, prefix, echo, error)
+
+            if not chunk:
+                break
+        log_file.flush()
+
+    def _forward_line(self, line: str, prefix: str, echo: bool, error: bool) -> None:
+        """
+        Affiche une ligne de sortie de playbook sur le terminal si nécessaire
+
+        Sans --stream, seules les lignes d'état des releases Helm
+        ("helm release <nom>: <état>", émises par les rôles qui déploient
+        plusieurs releases) sont affichées.
+
+        Args:
+            line: Ligne de sortie
+            prefix: Préfixe affiché devant la ligne ([playbook])
+            echo: Affiche toutes les lignes
+            error: Flux d'erreur (affiché en rouge)
+        """
+        if echo:
+            text = f"[{prefix}] {line.rstrip()}"
+            self._echo(f"{Colors.FAIL}{text}{Colors.ENDC}" if error else text)
+            return
+
+        text = line.strip()
+        if not text.startswith(self.RELEASE_MARKER):
+            return
+        release, _, state = text[len(self.RELEASE_MARKER) :].rstrip('"').partition(": ")
+        if state == "deployed":
+            self._echo(f"[{prefix}] {Colors.OKGREEN}✓{Colors.ENDC} {release}")
+        else:
+            self._echo(f"[{prefix}] {Colors.FAIL}✗ {release}: {state}{Colors.ENDC}")
+
+    def _echo(self, message: str) -> None:
+        """
+        Affiche un message sans l'entremêler avec ceux des autres playbooks
+
+        Args:
+            message: Message à afficher
+        """
+        with self._output_lock:
+            print(message, flush=True)
+
+    def _new_log_dir(self) -> Path:
+        """
+        Crée le répertoire de logs d'une nouvelle exécution
+
+        Les répertoires les plus anciens sont supprimés au-delà de LOG_RUNS_KEPT.
+
+        Returns:
+            Chemin du répertoire créé
+        """
+        import shutil
+
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        previous = sorted(path for path in self.logs_dir.iterdir() if path.is_dir())
+        for old_dir in previous[: max(len(previous) - self.LOG_RUNS_KEPT + 1, 0)]:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+        log_dir = self.logs_dir / datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        log_dir.mkdir()
+        return log_dir
+
+    def _tail(self, path: str, lines: int) -> List[str]:
+        """
+        Lit les dernières lignes d'un fichier de log sans le charger en mémoire
+
+        Args:
+            path: Chemin du fichier
+            lines: Nombre de lignes à conserver
+
+        Returns:
+            Dernières lignes du fichier (vide si le fichier n'existe pas)
+        """
+        if not path or not os.path.exists(path):
+            return []
+        with open(path, "r", errors="replace") as f:
+            return [line.rstrip("\n") for line in collections.deque(f, maxlen=lines)]
+
+    def show_output(self, results: List[PlaybookResult]) -> None:
+        """
+        Affiche la sortie complète des playbooks depuis leurs fichiers de log
+
+        Args:
+            results: Liste des résultats d'exécution
+        """
+        import shutil
+
+        print(f"\n{Colors.HEADER}{Colors.BOLD}SORTIE DÉTAILLÉE{Colors.ENDC}\n")
+        several = len({result.inventory for result in results}) > 1
+        for result in results:
+            title = f"{result.name} ({result.inventory})" if several else result.name
+            print(f"\n{Colors.BOLD}=== {title} ==={Colors.ENDC}")
+            if result.stdout_log and os.path.exists(result.stdout_log):
+                with open(result.stdout_log, "r", errors="replace") as f:
+                    shutil.copyfileobj(f, sys.stdout)
+            if result.stderr_log and os.path.exists(result.stderr_log):
+                with open(result.stderr_log, "r", errors="replace") as f:
+                    if os.fstat(f.fileno()).st_size:
+                        sys.stdout.write(Colors.FAIL)
+                        shutil.copyfileobj(f, sys.stdout)
+                        sys.stdout.write(Colors.ENDC)
+            if result.message:
+                print(f"{Colors.FAIL}{result.message}{Colors.ENDC}")
+
+    def run_playbooks(
+        self,
+        playbook_names: List[str],
+        parallel: bool = False,
+        max_workers: int = 4,
+        engine: str = "thread",
+        changed_only: bool = False,
+        helm_repo_ttl: float = HELM_REPO_TTL,
+        inventories: List[str] | None = None,
+        max_per_inventory: int | None = None,
+        fail_fast: bool = False,
+        **kwargs,
+    ) -> List[PlaybookResult]:
+        """
+        Exécute un ou plusieurs playbooks
+
+        Un playbook démarre dès que toutes ses dépendances (requires) ont réussi.
+        Les dépendants d'un playbook en échec sont ignorés (ou, avec fail_fast,
+        toute l'exécution est interrompue). Lorsque plusieurs
+        playbooks sont prêts, ceux du chemin critique (estimé à partir des
+        durées historiques) démarrent en premier.
+
+        Avec plusieurs inventaires, le graphe des playbooks est déployé sur
+        chacun d'eux: les dépendances sont résolues au sein d'un même
+        inventaire, et un échec n'affecte que les playbooks de cet inventaire.
+
+        Args:
+            playbook_names: Liste des noms de playbooks
+            parallel: Exécution parallèle
+            max_workers: Nombre de workers pour l'exécution parallèle (tous
+                inventaires confondus)
+            engine: Moteur d'exécution ("thread": un thread par playbook,
+                "asyncio": une boucle d'événements supervisant tous les playbooks,
+                "inprocess": comme thread, dans des workers Ansible préchauffés)
+            changed_only: N'exécute que les playbooks dont les entrées ont changé
+                depuis leur dernier déploiement réussi sur cet inventaire
+            helm_repo_ttl: Durée (secondes) pendant laquelle un index de dépôt
+                Helm rafraîchi est réutilisé d'une exécution à l'autre
+            inventories: Inventaires ciblés (défaut: kwargs["inventory"])
+            max_per_inventory: Nombre maximal de playbooks simultanés sur un
+                même inventaire
+            fail_fast: Au premier échec, arrête les playbooks en cours (SIGTERM
+                puis SIGKILL) et annule ceux en attente, tous inventaires
+                confondus. Sinon, seuls les dépendants du playbook en échec
+                sont ignorés
+            **kwargs: Arguments passés à _run_playbook
+
+        Returns:
+            Liste des résultats d'exécution
+        """
+        import asyncio
+
+        # Résoudre les dépendances et l'ordre
+        ordered_playbooks = self._resolve_dependencies(playbook_names)
+
+        inventories = list(
+            dict.fromkeys(inventories or [kwargs.get("inventory", "localhost")])
+        )
+        kwargs.pop("inventory", None)
+        labels = self._inventory_labels(inventories)
+        dry_run = kwargs.get("dry_run", False)
+
+        def node(inv: str, name: str) -> str:
+            # Un noeud par couple (inventaire, playbook): avec un seul
+            # inventaire, noms affichés et fichiers de log restent ceux des
+            # playbooks
+            return name if len(inventories) == 1 else f"{name}@{labels[inv]}"
+
+        # Noeuds entrelacés par inventaire pour qu'à priorité égale, les
+        # inventaires progressent ensemble
+        launches: Dict[str, Dict] = {
+            node(inv, name): dict(
+                kwargs, playbook_name=name, inventory=inv, label=node(inv, name)
+            )
+            for name in ordered_playbooks
+            for inv in inventories
+        }
+
+        durations: Dict[str, float] = {}
+        for inv in inventories:
+            for name, duration in self._estimate_durations(
+                ordered_playbooks, inv
+            ).items():
+                durations[node(inv, name)] = duration
+        checksums = {
+            label: self._input_checksum(
+                launch["playbook_name"],
+                launch["inventory"],
+                kwargs.get("extra_vars"),
+                kwargs.get("tags"),
+                kwargs.get("skip_tags"),
+            )
+            for label, launch in launches.items()
+        }
+        deployed = self._load_deployed()
+        unchanged = [
+            label
+            for label, launch in launches.items()
+            if changed_only
+            and deployed.get(launch["inventory"], {}).get(launch["playbook_name"])
+            == checksums[label]
+        ]
+
+        print(f"\n{Colors.HEADER}{Colors.BOLD}Plan d'exécution:{Colors.ENDC}")
+        if len(inventories) > 1:
+            print(f"  Inventaires: {', '.join(labels.values())}")
+        for i, name in enumerate(ordered_playbooks, 1):
+            requires = [
+                dep
+                for dep in self.playbooks[name].get("requires", [])
+                if dep in ordered_playbooks
+            ]
+            after = f" (après: {', '.join(requires)})" if requires else ""
+            estimates = [
+                durations[node(inv, name)]
+                for inv in inventories
+                if node(inv, name) in durations
+            ]
+            estimate = f" ~{max(estimates):.0f}s" if estimates else ""
+            same = [labels[inv] for inv in inventories if node(inv, name) in unchanged]
+            if len(inventories) == 1:
+                state = " [inchangé]" if same else ""
+            else:
+                state = f" [inchangé: {', '.join(same)}]" if same else ""
+            print(f"  {i}. {name}{after}{estimate}{state}")
+        print()
+
+        if parallel and len(launches) > 1:
+            limit = (
+                f", {max_per_inventory} par inventaire"
+                if max_per_inventory and len(inventories) > 1
+                else ""
+            )
+            if fail_fast:
+                limit += ", arrêt au premier échec"
+            print(
+                f"{Colors.BOLD}Mode parallèle activé (max {max_workers} workers{limit}){Colors.ENDC}\n"  # noqa
+            )
+        else:
+            print(f"{Colors.BOLD}Mode séquentiel{Colors.ENDC}\n")
+            max_workers = 1
+
+        kwargs.setdefault("log_dir", self._new_log_dir())
+        print(f"Logs: {kwargs['log_dir'].relative_to(self.base_dir)}\n")
+
+        if not dry_run:
+            repos = self._collect_helm_repos(
+                list(
+                    dict.fromkeys(
+                        launches[label]["playbook_name"]
+                        for label in launches
+                        if label not in unchanged
+                    )
+                )
+            )
+            if repos:
+                refreshed = self._refresh_helm_repos(repos, helm_repo_ttl)
+                for launch in launches.values():
+                    launch["helm_repos_refreshed"] = refreshed
+
+        for launch in launches.values():
+            launch["log_dir"] = kwargs["log_dir"]
+
+        scheduler = DependencyScheduler(
+            list(launches),
+            {
+                label: [
+                    node(launch["inventory"], dep)
+                    for dep in self.playbooks[launch["playbook_name"]].get(
+                        "requires", []
+                    )
+                ]
+                for label, launch in launches.items()
+            },
+            durations,
+            groups={label: launch["inventory"] for label, launch in launches.items()},
+            group_limit=max_per_inventory,
+        )
+
+        results = []
+        for label in unchanged:
+            scheduler.complete(label, True)
+            results.append(
+                PlaybookResult(
+                    launches[label]["playbook_name"],
+                    0,
+                    Status.UNCHANGED,
+                    message="Entrées inchangées depuis le dernier déploiement",
+                    inventory=launches[label]["inventory"],
+                )
+            )
+
+        def on_result(result: PlaybookResult) -> None:
+            checksum = checksums[node(result.inventory, result.name)]
+            self._record_run(
+                result,
+                result.inventory,
+                dry_run,
+                run_id=kwargs["log_dir"].name,
+                tags=kwargs.get("tags"),
+                checksum=checksum,
+            )
+            if result.returncode == 0 and not dry_run:
+                self._save_deployed(result.inventory, result.name, checksum)
+
+        if engine == "asyncio":
+            results += asyncio.run(
+                self._schedule_async(
+                    scheduler, max_workers, launches, on_result, fail_fast
+                )
+            )
+        elif engine == "inprocess":
+            warm_pool = WarmWorkerPool(self.base_dir)
+            for launch in launches.values():
+                launch["warm_pool"] = warm_pool
+            try:
+                results += self._schedule_threads(
+                    scheduler, max_workers, launches, on_result, fail_fast
+                )
+            finally:
+                warm_pool.close()
+        else:
+            results += self._schedule_threads(
+                scheduler, max_workers, launches, on_result, fail_fast
+            )
+        if len(inventories) > 1:
+            results.sort(key=lambda result: inventories.index(result.inventory))
+        return results
+
+    def _inventory_labels(self, inventories: List[str]) -> Dict[str, str]:
+        """
+        Construit un nom court pour chaque inventaire
+
+        Le nom retenu est celui du fichier sans extension (ex: prod pour
+        inventories/prod.yaml), ou le chemin complet en cas d'homonymie.
+
+        Args:
+            inventories: Inventaires ciblés
+
+        Returns:
+            Dictionnaire inventaire -> nom court
+        """
+        stems = collections.Counter(Path(inv).stem for inv in inventories)
+        return {
+            inv: (
+                Path(inv).stem
+                if stems[Path(inv).stem] == 1
+                else inv.strip("/").replace("/", "_")
+            )
+            for inv in inventories
+        }
+
+    def _expand_inventory_dir(self, directory: str) -> List[str]:
+        """
+        Liste les inventaires contenus dans un répertoire
+
+        Chaque fichier ou sous-répertoire est un inventaire distinct (à la
+        différence de `-i <répertoire>`, qu'Ansible fusionne en un seul
+        inventaire). Les fichiers cachés et les répertoires group_vars et
+        host_vars sont ignorés.
+
+        Args:
+            directory: Répertoire des inventaires (relatif au projet ou absolu)
+
+        Returns:
+            Chemins des inventaires, triés par nom
+        """
+        path = Path(directory)
+        root = path if path.is_absolute() else self.base_dir / path
+        if not root.is_dir():
+            raise FileNotFoundError(
+                f"Répertoire d'inventaires introuvable: {directory}"
+            )
+        return [
+            str(path / entry.name)
+            for entry in sorted(root.iterdir())
+            if not entry.name.startswith(".")
+            and entry.name not in ("group_vars", "host_vars")
+        ]
+
+    def _schedule_threads(
+        self,
+        scheduler: DependencyScheduler,
+        max_workers: int,
+        launches: Mapping[str, Mapping],
+        on_result: Callable[[PlaybookResult], None],
+        fail_fast: bool = False,
+    ) -> List[PlaybookResult]:
+        """
+        Exécute les playbooks de l'ordonnanceur avec un pool de threads
+
+        Args:
+            scheduler: Ordonnanceur des playbooks
+            max_workers: Nombre maximal de playbooks simultanés
+            launches: Arguments de _run_playbook pour chaque noeud
+            on_result: Fonction appelée à la fin de chaque playbook exécuté
+            fail_fast: Au premier échec, arrête les playbooks en cours et
+                annule ceux en attente
+
+        Returns:
+            Liste des résultats d'exécution
+        """
+        import concurrent.futures
+
+        results = []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            interrupted: Dict[str, str] = {}
+            try:
+                while not scheduler.finished:
+                    results.extend(self._skip_blocked(scheduler, launches))
+
+                    for node in scheduler.next_ready(max_workers - len(running)):
+                        future = executor.submit(self._run_playbook, **launches[node])
+                        running[future] = node
+
+                    if not running:
+                        continue
+
+                    done, _ = concurrent.futures.wait(
+                        running, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        node = running.pop(future)
+                        result = self._node_result(future.result(), launches[node])
+                        result = self._interrupted_result(result, interrupted.get(node))
+                        self._stopping.discard(launches[node]["label"])
+                        scheduler.complete(node, result.returncode == 0)
+                        on_result(result)
+                        results.append(result)
+
+                        if fail_fast and result.status == Status.FAILED:
+                            reason = f"échec de {launches[node]['label']}"
+                            results.extend(
+                                self._cancel_queued(scheduler, launches, reason)
+                            )
+                            for process in self._interrupt_running(
+                                running.values(), launches, reason, interrupted
+                            ):
+                                # Arrêts simultanés: chacun peut attendre le
+                                # délai de grâce avant SIGKILL
+                                threading.Thread(
+                                    target=self._terminate_process,
+                                    args=(process,),
+                                    daemon=True,
+                                ).start()
+            except KeyboardInterrupt:
+                # Les playbooks tournent dans leur propre groupe de processus:
+                # Ctrl-C ne leur parvient pas, il faut les arrêter explicitement
+                for process in list(self._processes.values()):
+                    self._terminate_process(process)
+                raise
+
+        return results
+
+    async def _schedule_async(
+        self,
+        scheduler: DependencyScheduler,
+        max_workers: int,
+        launches: Mapping[str, Mapping],
+        on_result: Callable[[PlaybookResult], None],
+        fail_fast: bool = False,
+    ) -> List[PlaybookResult]:
+        """
+        Exécute les playbooks de l'ordonnanceur dans une boucle asyncio
+
+        Une seule boucle supervise tous les processus ansible-playbook. Si
+        l'exécution est annulée (Ctrl-C), tous les playbooks en cours sont
+        arrêtés avant de rendre la main.
+
+        Args:
+            scheduler: Ordonnanceur des playbooks
+            max_workers: Nombre maximal de playbooks simultanés
+            launches: Arguments de _run_playbook_async pour chaque noeud
+            on_result: Fonction appelée à la fin de chaque playbook exécuté
+            fail_fast: Au premier échec, arrête les playbooks en cours et
+                annule ceux en attente
+
+        Returns:
+            Liste des résultats d'exécution
+        """
+        import asyncio
+
+        results = []
+        running = {}
+        interrupted: Dict[str, str] = {}
+        terminations = []
+
+        try:
+            while not scheduler.finished:
+                results.extend(self._skip_blocked(scheduler, launches))
+
+                for node in scheduler.next_ready(max_workers - len(running)):
+                    task = asyncio.create_task(
+                        self._run_playbook_async(**launches[node])
+                    )
+                    running[task] = node
+
+                if not running:
+                    continue
+
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    node = running.pop(task)
+                    result = self._node_result(task.result(), launches[node])
+                    result = self._interrupted_result(result, interrupted.get(node))
+                    self._stopping.discard(launches[node]["label"])
+                    scheduler.complete(node, result.returncode == 0)
+                    on_result(result)
+                    results.append(result)
+
+                    if fail_fast and result.status == Status.FAILED:
+                        reason = f"échec de {launches[node]['label']}"
+                        results.extend(self._cancel_queued(scheduler, launches, reason))
+                        for process in self._interrupt_running(
+                            running.values(), launches, reason, interrupted
+                        ):
+                            terminations.append(
+                                asyncio.ensure_future(
+                                    self._terminate_process_async(process)
+                                )
+                            )
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, *terminations, return_exceptions=True)
+
+        return results
+
+    @staticmethod
+    def _node_result(result: PlaybookResult, launch: Mapping) -> PlaybookResult:
+        """
+        Rattache le résultat d'un noeud à son playbook et à son inventaire
+
+        Args:
+            result: Résultat renvoyé par _run_playbook (nommé d'après le label)
+            launch: Arguments de lancement du noeud
+
+        Returns:
+            Résultat portant le nom du playbook et l'inventaire
+        """
+        return result._replace(
+            name=launch["playbook_name"], inventory=launch["inventory"]
+        )
+
+    def _skip_blocked(
+        self, scheduler: DependencyScheduler, launches: Mapping[str, Mapping]
+    ) -> List[PlaybookResult]:
+        """
+        Retire de l'ordonnanceur les playbooks qui ne pourront pas s'exécuter
+
+        Args:
+            scheduler: Ordonnanceur des playbooks
+            launches: Arguments de lancement de chaque noeud
+
+        Returns:
+            Résultats des playbooks ignorés
+        """
+        skipped = []
+        for node, reason in scheduler.pop_skipped():
+            launch = launches[node]
+            self._echo(
+                f"{Colors.WARNING}[{datetime.now().strftime('%H:%M:%S')}] ⊘ Ignoré: {launch['label']} ({reason}){Colors.ENDC}"  # noqa
+            )
+            skipped.append(
+                PlaybookResult(
+                    launch["playbook_name"],
+                    1,
+                    Status.SKIPPED,
+                    message=f"Ignoré: {reason}",
+                    inventory=launch["inventory"],
+                )
+            )
+        return skipped
+
+    def _cancel_queued(
+        self,
+        scheduler: DependencyScheduler,
+        launches: Mapping[str, Mapping],
+        reason: str,
+    ) -> List[PlaybookResult]:
+        """
+        Annule les playbooks en attente (--fail-fast)
+
+        Args:
+            scheduler: Ordonnanceur des playbooks
+            launches: Arguments de lancement de chaque noeud
+            reason: Cause de l'annulation
+
+        Returns:
+            Résultats des playbooks annulés
+        """
+        cancelled = []
+        for node in scheduler.cancel():
+            launch = launches[node]
+            self._echo(
+                f"{Colors.WARNING}[{datetime.now().strftime('%H:%M:%S')}] ■ Annulé: {launch['label']} ({reason}){Colors.ENDC}"  # noqa
+            )
+            cancelled.append(
+                PlaybookResult(
+                    launch["playbook_name"],
+                    1,
+                    Status.CANCELLED,
+                    message=f"Annulé avant démarrage: {reason}",
+                    inventory=launch["inventory"],
+                )
+            )
+        return cancelled
+
+    def _interrupt_running(
+        self,
+        nodes: Iterable[str],
+        launches: Mapping[str, Mapping],
+        reason: str,
+        interrupted: Dict[str, str],
+    ) -> List:
+        """
+        Demande l'arrêt des playbooks en cours (--fail-fast)
+
+        Un playbook dont le processus n'est pas encore lancé sera arrêté par
+        son runner dès le lancement.
+
+        Args:
+            nodes: Noeuds en cours d'exécution
+            launches: Arguments de lancement de chaque noeud
+            reason: Cause de l'arrêt
+            interrupted: Noeuds déjà arrêtés et cause de leur arrêt (mis à jour)
+
+        Returns:
+            Processus déjà lancés, à arrêter par l'appelant
+        """
+        processes = []
+        for node in nodes:
+            if node in interrupted:
+                continue
+            interrupted[node] = reason
+            self._stopping.add(launches[node]["label"])
+            process = self._processes.get(launches[node]["label"])
+            if process is not None:
+                processes.append(process)
+        return processes
+
+    @staticmethod
+    def _interrupted_result(
+        result: PlaybookResult, reason: str | None
+    ) -> PlaybookResult:
+        """
+        Marque comme annulé un playbook arrêté en cours d'exécution (--fail-fast)
+
+        Un playbook terminé avec succès avant son arrêt conserve son résultat.
+
+        Args:
+            result: Résultat du playbook
+            reason: Cause de l'arrêt, None si le playbook n'a pas été arrêté
+
+        Returns:
+            Résultat éventuellement marqué comme annulé
+        """
+        if reason is None or result.returncode == 0:
+            return result
+        return result._replace(
+            status=Status.CANCELLED, message=f"Interrompu en cours: {reason}"
+        )
+
+    def _estimate_durations(
+        self, playbook_names: List[str], inventory: str
+    ) -> Dict[str, float]:
+        """
+        Estime la durée des playbooks à partir de l'historique des exécutions
+
+        La durée retenue est la médiane des dernières exécutions réussies sur
+        le même inventaire (à défaut, sur n'importe quel inventaire). Les
+        playbooks jamais exécutés reçoivent la moyenne des durées connues.
+
+        Args:
+            playbook_names: Liste des playbooks à estimer
+            inventory: Inventaire ciblé
+
+        Returns:
+            Dictionnaire playbook -> durée estimée (secondes)
+        """
+        import statistics
+
+        samples: Dict[str, List[float]] = {}
+        fallback: Dict[str, List[float]] = {}
+
+        for record in self._load_history():
+            if record.get("returncode") != 0 or record.get("dry_run"):
+                continue
+            target = samples if record.get("inventory") == inventory else fallback
+            target.setdefault(record["playbook"], []).append(record["duration"])
+
+        durations = {}
+        for name in playbook_names:
+            runs = samples.get(name) or fallback.get(name)
+            if runs:
+                durations[name] = statistics.median(runs[-self.HISTORY_SAMPLES :])
+
+        if durations:
+            default = statistics.mean(durations.values())
+            for name in playbook_names:
+                durations.setdefault(name, default)
+
+        return durations
+
+    def _record_run(
+        self,
+        result: PlaybookResult,
+        inventory: str,
+        dry_run: bool,
+        run_id: str = "",
+        tags: List[str] | None = None,
+        checksum: str = "",
+    ) -> None:
+        """
+        Ajoute une exécution de playbook à l'historique local
+
+        Args:
+            result: Résultat d'exécution du playbook
+            inventory: Inventaire utilisé
+            dry_run: Exécution en mode simulation
+            run_id: Identifiant de l'exécution (répertoire de logs)
+            tags: Tags exécutés
+            checksum: Empreinte des entrées du playbook
+        """
+        import json
+
+        end = datetime.now()
+        record = {
+            "run": run_id,
+            "playbook": result.name,
+            "inventory": inventory,
+            "status": result.status,
+            "returncode": result.returncode,
+            "start": datetime.fromtimestamp(
+                end.timestamp() - result.duration
+            ).isoformat(timespec="seconds"),
+            "end": end.isoformat(timespec="seconds"),
+            "duration": round(result.duration, 3),
+            "dry_run": dry_run,
+            "tags": tags or [],
+            "checksum": checksum,
+        }
+
+        try:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.history_file, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(
+                f"{Colors.WARNING}Historique non enregistré ({self.history_file}): {e}{Colors.ENDC}"  # noqa
+            )
+
+    def _load_history(self) -> List[Dict]:
+        """
+        Charge l'historique des exécutions (lignes invalides ignorées)
+
+        Returns:
+            Liste des enregistrements, du plus ancien au plus récent
+        """
+        import json
+
+        records = []
+        if self.history_file.exists():
+            with open(self.history_file, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(record, dict) and "playbook" in record:
+                        records.append(record)
+        return records
+
+    def show_history(
+        self, inventory: str | None = None, playbook_names: List[str] | None = None
+    ) -> None:
+        """
+        Affiche les statistiques de durée par playbook
+
+        Pour chaque playbook: nombre d'exécutions, taux de succès, durées
+        p50/p95 des exécutions réussies (hors dry-run) et tendance (pente de
+        la régression linéaire de la durée dans le temps, en secondes/jour).
+
+        Args:
+            inventory: Ne retenir que les exécutions sur cet inventaire
+            playbook_names: Ne retenir que ces playbooks
+        """
+        import statistics
+
+        runs: Dict[str, List[Dict]] = {}
+        for record in self._load_history():
+            if record.get("dry_run"):
+                continue
+            if inventory and record.get("inventory") != inventory:
+                continue
+            if playbook_names and record["playbook"] not in playbook_names:
+                continue
+            runs.setdefault(record["playbook"], []).append(record)
+
+        print(
+            f"\n{Colors.HEADER}{Colors.BOLD}Historique des exécutions:{Colors.ENDC}\n"
+        )
+        if not runs:
+            print(f"{Colors.WARNING}Aucune exécution enregistrée{Colors.ENDC}\n")
+            return
+
+        trends = {}
+        print(
+            f"{Colors.BOLD}{'Playbook':<24} {'Exéc.':>6} {'Succès':>7} "
+            f"{'p50':>8} {'p95':>8} {'Tendance':>12}{Colors.ENDC}"
+        )
+        for name, records in sorted(runs.items()):
+            ok = [r for r in records if r.get("returncode") == 0]
+            durations = [r["duration"] for r in ok]
+            p50 = p95 = "-"
+            if durations:
+                p50 = f"{statistics.median(durations):.1f}s"
+                p95 = f"{self._percentile(durations, 95):.1f}s"
+
+            trend = "-"
+            points = [
+                (datetime.fromisoformat(r["end"]).timestamp() / 86400, r["duration"])
+                for r in ok
+                if r.get("end")
+            ]
+            # Tendance calculée sur au moins un jour pour ne pas extrapoler du bruit
+            days = [x for x, _ in points]
+            if len(points) >= 3 and max(days) - min(days) >= 1:
+                slope = statistics.linear_regression(*zip(*points)).slope
+                trends[name] = slope
+                trend = f"{slope:+.1f}s/j"
+
+            print(
+                f"{name:<24} {len(records):>6} {len(ok) * 100 // len(records):>6}% "
+                f"{p50:>8} {p95:>8} {trend:>12}"
+            )
+
+        growing = sorted(
+            (item for item in trends.items() if item[1] > 0),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        if growing:
+            print(f"\n{Colors.BOLD}Playbooks qui ralentissent le plus:{Colors.ENDC}")
+            for name, slope in growing[:5]:
+                print(f"  {Colors.WARNING}↗{Colors.ENDC} {name}: {slope:+.1f}s/jour")
+        print()
+
+    def profile_playbook(
+        self, playbook_name: str, collapsed_file: Path | None = None, **kwargs
+    ) -> PlaybookResult:
+        """
+        Exécute un playbook et affiche la répartition de son temps d'exécution
+
+        Le temps est agrégé par rôle, par tâche et par module à partir des
+        événements du callback cli_events, et exporté au format « collapsed
+        stack » (lisible par speedscope ou flamegraph.pl).
+
+        Args:
+            playbook_name: Nom du playbook
+            collapsed_file: Fichier collapsed stack (défaut: dans les logs)
+            **kwargs: Arguments passés à _run_playbook
+
+        Returns:
+            Résultat de l'exécution
+        """
+        inventory = kwargs.get("inventory", "localhost")
+        dry_run = kwargs.get("dry_run", False)
+        kwargs.setdefault("log_dir", self._new_log_dir())
+        print(f"Logs: {kwargs['log_dir'].relative_to(self.base_dir)}\n")
+
+        result = self._run_playbook(playbook_name, **kwargs)
+        self._record_run(
+            result,
+            inventory,
+            dry_run,
+            run_id=kwargs["log_dir"].name,
+            tags=kwargs.get("tags"),
+            checksum=self._input_checksum(
+                playbook_name,
+                inventory,
+                kwargs.get("extra_vars"),
+                kwargs.get("tags"),
+                kwargs.get("skip_tags"),
+            ),
+        )
+
+        tasks = self._profile_tasks(result.events_log)
+        collapsed_file = (
+            collapsed_file or kwargs["log_dir"] / f"{playbook_name}.collapsed"
+        )
+        self.show_profile(playbook_name, tasks, result.duration, collapsed_file)
+        return result
+
+    def _profile_tasks(self, events_log: str) -> List[Dict]:
+        """
+        Calcule la durée de chaque tâche à partir des événements d'un playbook
+
+        La durée d'une tâche va de son démarrage au démarrage de la tâche
+        suivante (ou à la fin du playbook): elle couvre tous les hôtes.
+
+        Args:
+            events_log: Fichier des événements JSON
+
+        Returns:
+            Liste de {"role", "task", "action", "duration"} dans l'ordre
+            d'exécution
+        """
+        import json
+
+        tasks = []
+        last_time = None
+        if events_log and os.path.exists(events_log):
+            with open(events_log, "r", errors="replace") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(event, dict) or "time" not in event:
+                        continue
+                    last_time = event["time"]
+                    if event.get("event") == "task_start":
+                        if tasks:
+                            tasks[-1]["duration"] = last_time - tasks[-1]["start"]
+                        tasks.append(
+                            {
+                                "role": event.get("role") or "(playbook)",
+                                "task": event.get("task", ""),
+                                "action": event.get("action", ""),
+                                "start": last_time,
+                            }
+                        )
+        if tasks:
+            tasks[-1]["duration"] = last_time - tasks[-1]["start"]
+        for task in tasks:
+            del task["start"]
+        return tasks
+
+    def show_profile(
+        self,
+        playbook_name: str,
+        tasks: List[Dict],
+        total: float,
+        collapsed_file: Path,
+    ) -> None:
+        """
+        Affiche le temps passé par rôle, tâche et module et écrit le collapsed stack
+
+        Args:
+            playbook_name: Nom du playbook
+            tasks: Durées des tâches (voir _profile_tasks)
+            total: Durée totale d'ansible-playbook (secondes)
+            collapsed_file: Fichier collapsed stack à écrire
+        """
+        print(f"\n{Colors.HEADER}{Colors.BOLD}PROFIL: {playbook_name}{Colors.ENDC}")
+        if not tasks:
+            print(
+                f"{Colors.WARNING}Aucun événement de tâche reçu (callback cli_events inactif ?){Colors.ENDC}\n"  # noqa
+            )
+            return
+
+        # Temps hors tâches: démarrage d'Ansible, parsing, récapitulatif
+        overhead = max(total - sum(task["duration"] for task in tasks), 0.0)
+
+        for title, key in (
+            ("Rôle", lambda t: t["role"]),
+            ("Tâche", lambda t: f"{t['role']} : {t['task']}"),
+            ("Module", lambda t: t["action"]),
+        ):
+            totals: Dict[str, float] = collections.defaultdict(float)
+            counts: Dict[str, int] = collections.Counter()
+            for task in tasks:
+                totals[key(task)] += task["duration"]
+                counts[key(task)] += 1
+            print(
+                f"\n{Colors.BOLD}{'Par ' + title.lower():<60} {'Nb':>4} {'Durée':>9} {'%':>6}{Colors.ENDC}"  # noqa
+            )
+            for name, duration in sorted(totals.items(), key=lambda i: -i[1]):
+                share = duration * 100 / total if total else 0
+                print(
+                    f"{name[:60]:<60} {counts[name]:>4} {duration:>8.1f}s {share:>5.1f}%"
+                )
+
+        share = overhead * 100 / total if total else 0
+        print(
+            f"\n{'Hors tâches (démarrage, parsing)':<60} {'':>4} {overhead:>8.1f}s {share:>5.1f}%"
+        )
+
+        lines = collections.Counter()
+        for task in tasks:
+            action = f" [{task['action']}]" if task["action"] else ""
+            frames = [playbook_name, task["role"], task["task"] + action]
+            stack = ";".join(frame.replace(";", ",") for frame in frames)
+            lines[stack] += round(task["duration"] * 1000)
+        lines[f"{playbook_name};(hors tâches)"] += round(overhead * 1000)
+
+        try:
+            collapsed_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(collapsed_file, "w") as f:
+                for stack, millis in lines.items():
+                    f.write(f"{stack} {millis}\n")
+            print(f"\nCollapsed stack (ms): {collapsed_file}\n")
+        except OSError as e:
+            print(
+                f"{Colors.WARNING}Collapsed stack non enregistré ({collapsed_file}): {e}{Colors.ENDC}\n"  # noqa
+            )
+
+    @staticmethod
+    def _percentile(values: List[float], percent: float) -> float:
+        """
+        Calcule un percentile par interpolation linéaire
+
+        Args:
+            values: Valeurs (non vides)
+            percent: Percentile (0-100)
+
+        Returns:
+            Valeur du percentile
+        """
+        ordered = sorted(values)
+        rank = (len(ordered) - 1) * percent / 100
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+    def _input_checksum(
+        self,
+        playbook_name: str,
+        inventory: str,
+        extra_vars: Mapping | None = None,
+        tags: List[str] | None = None,
+        skip_tags: List[str] | None = None,
+    ) -> str:
+        """
+        Calcule l'empreinte des entrées d'un playbook
+
+        L'empreinte couvre le playbook, tous les fichiers de ses rôles (tasks,
+        templates, vars/main.yaml, files...) hors fichiers example.*,
+        ansible.cfg, l'inventaire et les paramètres d'exécution.
+
+        Args:
+            playbook_name: Nom du playbook
+            inventory: Fichier d'inventaire ou hôte
+            extra_vars: Variables supplémentaires
+            tags: Tags à exécuter
+            skip_tags: Tags à ignorer
+
+        Returns:
+            Empreinte SHA-256 (hexadécimale)
+        """
+        import hashlib
+        import json
+
+        playbook_path = self.base_dir / self.playbooks[playbook_name]["path"]
+        files = [playbook_path, self.base_dir / "ansible.cfg"]
+        for role_dir in self._playbook_roles(playbook_path):
+            files.extend(
+                sorted(
+                    path
+                    for path in role_dir.rglob("*")
+                    if path.is_file() and not path.name.startswith("example.")
+                )
+            )
+
+        inventory_path = self.base_dir / inventory
+        if inventory_path.is_file():
+            files.append(inventory_path)
+        elif inventory_path.is_dir():
+            files.extend(sorted(p for p in inventory_path.rglob("*") if p.is_file()))
+
+        digest = hashlib.sha256()
+        for path in files:
+            digest.update(os.path.relpath(path, self.base_dir).encode() + b"\0")
+            if path.is_file():
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            digest.update(b"\0")
+
+        params = {
+            "inventory": inventory,
+            "extra_vars": extra_vars,
+            "tags": tags,
+            "skip_tags": skip_tags,
+        }
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _included_roles(tasks: object) -> List[str]:
+        """
+        Liste les rôles inclus (include_role, import_role) par des tâches
+
+        Les blocs sont parcourus; les noms de rôles templatés sont ignorés.
+
+        Args:
+            tasks: Tâches chargées depuis le YAML
+
+        Returns:
+            Noms des rôles inclus
+        """
+        names = []
+        if isinstance(tasks, list):
+            for task in tasks:
+                names.extend(AnsibleCLI._included_roles(task))
+        elif isinstance(tasks, dict):
+            for key, value in tasks.items():
+                if key.rsplit(".", 1)[-1] in ("include_role", "import_role"):
+                    name = value.get("name") if isinstance(value, dict) else None
+                    if isinstance(name, str) and "{{" not in name:
+                        names.append(name)
+                else:
+                    names.extend(AnsibleCLI._included_roles(value))
+        return names
+
+    def _playbook_roles(self, playbook_path: Path) -> List[Path]:
+        """
+        Liste les répertoires des rôles utilisés par un playbook
+
+        Outre les rôles de `roles:`, la liste comprend, de proche en proche,
+        les rôles inclus par leurs tâches (include_role, import_role) et leurs
+        dépendances (meta/main.yaml).
+
+        Args:
+            playbook_path: Chemin du playbook
+
+        Returns:
+            Répertoires des rôles trouvés dans roles_dirs
+        """
+        import yaml
+
+        try:
+            with open(playbook_path, "r") as f:
+                plays = yaml.safe_load(f) or []
+        except (OSError, yaml.YAMLError):
+            return []
+
+        names = []
+        for play in plays if isinstance(plays, list) else []:
+            if not isinstance(play, dict):
+                continue
+            for entry in play.get("roles") or []:
+                names.append(entry if isinstance(entry, str) else entry.get("role", ""))
+            for section in ("pre_tasks", "tasks", "post_tasks", "handlers"):
+                names.extend(self._included_roles(play.get(section)))
+
+        roles: List[Path] = []
+        while names:
+            name = names.pop(0)
+            role_dir = self._role_dir(name) if name else None
+            if not role_dir or role_dir in roles:
+                continue
+            roles.append(role_dir)
+            for path in sorted(role_dir.glob("*/*.y*ml")):
+                if path.parent.name not in ("tasks", "handlers", "meta"):
+                    continue
+                try:
+                    with open(path, "r") as f:
+                        data = yaml.safe_load(f)
+                except (OSError, yaml.YAMLError):
+                    continue
+                if path.parent.name != "meta":
+                    names.extend(self._included_roles(data))
+                elif isinstance(data, dict):
+                    for dep in data.get("dependencies") or []:
+                        names.append(
+                            dep if isinstance(dep, str) else dep.get("role", "")
+                        )
+        return roles
+
+    def _collect_helm_repos(self, playbook_names: List[str]) -> List[Tuple[str, str]]:
+        """
+        Collecte les dépôts Helm (helm.repo_name, helm.repo_url) des rôles des playbooks
+
+        Un même dépôt peut être déclaré sous plusieurs noms par des rôles
+        différents: chaque couple (nom, URL) est conservé, les chart_ref des
+        rôles utilisant leur propre nom.
+
+        Args:
+            playbook_names: Noms des playbooks
+
+        Returns:
+            Couples (nom du dépôt, URL) distincts
+        """
+        import yaml
+
+        repos: Dict[Tuple[str, str], None] = {}
+        for name in playbook_names:
+            playbook_path = self.base_dir / self.playbooks[name]["path"]
+            for role_dir in self._playbook_roles(playbook_path):
+                try:
+                    with open(role_dir / "vars" / "main.yaml", "r") as f:
+                        role_vars = yaml.safe_load(f) or {}
+                except (OSError, yaml.YAMLError):
+                    continue
+                helm = role_vars.get("helm") if isinstance(role_vars, dict) else None
+                if not isinstance(helm, dict):
+                    continue
+                url, repo_name = helm.get("repo_url"), helm.get("repo_name")
+                # Les registres OCI n'ont pas d'index à rafraîchir
+                if url and repo_name and not str(repo_name).startswith("oci://"):
+                    repos[(str(repo_name), str(url))] = None
+        return list(repos)
+
+    def _refresh_helm_repos(
+        self, repos: List[Tuple[str, str]], ttl: float
+    ) -> List[str]:
+        """
+        Rafraîchit une seule fois l'index de chaque dépôt Helm
+
+        Les dépôts rafraîchis depuis moins de ttl secondes (et toujours
+        déclarés dans helm sous le même nom et la même URL) ne sont pas
+        retéléchargés. Les autres sont ajoutés ou rafraîchis en parallèle avec
+        `helm repo add --force-update`.
+
+        Args:
+            repos: Couples (nom du dépôt, URL)
+            ttl: Durée de validité d'un index rafraîchi (secondes)
+
+        Returns:
+            Noms des dépôts dont l'index est à jour
+        """
+        import concurrent.futures
+        import json
+        import subprocess
+        import time
+
+        try:
+            with open(self.helm_repos_file, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+
+        try:
+            listed = subprocess.run(
+                ["helm", "repo", "list", "-o", "json"],
+                capture_output=True,
+                text=True,
+            )
+        except OSError as e:
+            print(f"{Colors.WARNING}Pré-vol Helm ignoré: {e}{Colors.ENDC}\n")
+            return []
+        try:
+            known = {
+                (repo["name"], repo["url"].rstrip("/"))
+                for repo in json.loads(listed.stdout or "[]")
+            }
+        except (ValueError, KeyError, TypeError):
+            known = set()
+
+        now = time.time()
+        fresh = [
+            (name, url)
+            for name, url in repos
+            if now - state.get(name, {}).get("refreshed", 0) < ttl
+            and state[name].get("url") == url
+            and (name, url.rstrip("/")) in known
+        ]
+
+        def refresh(
+            repo: Tuple[str, str],
+        ) -> Tuple[Tuple[str, str], subprocess.CompletedProcess]:
+            cmd = ["helm", "repo", "add", repo[0], repo[1], "--force-update"]
+            return repo, subprocess.run(cmd, capture_output=True, text=True)
+
+        print(f"{Colors.BOLD}Dépôts Helm:{Colors.ENDC}")
+        for name, url in fresh:
+            print(f"  {Colors.OKCYAN}={Colors.ENDC} {name} ({url}) en cache")
+
+        refreshed = [name for name, _ in fresh]
+        stale = [repo for repo in repos if repo not in fresh]
+        if stale:
+            with concurrent.futures.ThreadPoolExecutor(len(stale)) as executor:
+                for (name, url), proc in executor.map(refresh, stale):
+                    if proc.returncode == 0:
+                        refreshed.append(name)
+                        state[name] = {"url": url, "refreshed": time.time()}
+                        print(f"  {Colors.OKGREEN}✓{Colors.ENDC} {name} ({url})")
+                    else:
+                        print(
+                            f"  {Colors.FAIL}✗{Colors.ENDC} {name} ({url}): {proc.stderr.strip()}"  # noqa
+                        )
+            try:
+                self._write_json(self.helm_repos_file, state)
+            except OSError as e:
+                print(
+                    f"{Colors.WARNING}Cache des dépôts Helm non enregistré ({self.helm_repos_file}): {e}{Colors.ENDC}"  # noqa
+                )
+        print()
+        return refreshed
+
+    def _role_dir(self, role: str) -> Path | None:
+        """
+        Trouve le répertoire d'un rôle dans roles_dirs
+
+        Args:
+            role: Nom du rôle (ex: apps/airflow)
+
+        Returns:
+            Répertoire du rôle, None s'il n'existe pas
+        """
+        for roles_dir in self.roles_dirs:
+            if (roles_dir / role).is_dir():
+                return roles_dir / role
+        return None
+
+    @staticmethod
+    def _merge_vars(base: Mapping, override: Mapping) -> Dict:
+        """Fusionne récursivement deux dictionnaires (combine recursive=True)"""
+        merged = dict(base)
+        for key, value in override.items():
+            if isinstance(value, Mapping) and isinstance(merged.get(key), Mapping):
+                merged[key] = AnsibleCLI._merge_vars(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+
+    def _role_vars(self, role_dir: Path) -> Dict | None:
+        """
+        Charge les variables d'un rôle (defaults/main.yaml puis vars/main.yaml)
+
+        Args:
+            role_dir: Répertoire du rôle
+
+        Returns:
+            Variables du rôle, None si vars/main.yaml est absent ou illisible
+        """
+        import yaml
+
+        role_vars: Dict = {}
+        for path in (
+            role_dir / "defaults" / "main.yaml",
+            role_dir / "vars" / "main.yaml",
+        ):
+            try:
+                with open(path, "r") as f:
+                    data = yaml.safe_load(f) or {}
+            except (OSError, yaml.YAMLError):
+                if path.parent.name == "vars":
+                    return None
+                continue
+            if isinstance(data, dict):
+                role_vars.update(data)
+        return role_vars
+
+    def _render_values(self, role_dir: Path, role_vars: Mapping) -> Dict:
+        """
+        Rend le template values.yaml.jinja d'un rôle avec ses variables
+
+        Seuls les filtres Jinja2 standards sont disponibles: un template qui
+        en utilise d'autres, ou dont le rendu n'est pas du YAML, donne {} (les
+        valeurs par défaut des charts s'appliquent alors).
+
+        Args:
+            role_dir: Répertoire du rôle
+            role_vars: Variables du rôle
+
+        Returns:
+            Values Helm rendues
+        """
+        import jinja2
+        import yaml
+
+        try:
+            source = (role_dir / "templates" / "values.yaml.jinja").read_text()
+            # L'en-tête #jinja2: n'est interprété que par Ansible
+            if source.startswith("#jinja2:"):
+                source = source.split("\n", 1)[-1]
+            env = jinja2.Environment(
+                variable_start_string="<<",
+                variable_end_string=">>",
+                undefined=jinja2.ChainableUndefined,
+            )
+            values = yaml.safe_load(env.from_string(source).render(role_vars))
+        except (OSError, jinja2.TemplateError, yaml.YAMLError):
+            return {}
+        return values if isinstance(values, dict) else {}
+
+    @staticmethod
+    def _surge(pods: int) -> int:
+        """Pods d'un Deployment pendant un rolling update (maxSurge 25%)"""
+        return pods + -(-pods // 4)
+
+    @staticmethod
+    def _vars_text(value: object) -> str:
+        """
+        Convertit une variable de rôle en texte, "" si elle n'est pas renseignée
+
+        Une variable vide rendue par un template de values devient "None";
+        les fichiers d'exemple utilisent aussi "to_define".
+
+        Args:
+            value: Valeur de la variable
+
+        Returns:
+            Texte de la variable
+        """
+        text = "" if value is None else str(value).strip()
+        return "" if text in ("None", "null", "~", "to_define") else text
+
+    def _superset_connections(
+        self, role_dir: Path, role_vars: Mapping
+    ) -> List[ConnectionDemand]:
+        """
+        Estime les connexions de Superset (rôle chartsgouv)
+
+        Reprend le calcul des pools du rôle: chaque processus web dispose de
+        sa part de max_db_connections, chaque processus Celery de 2 connexions.
+
+        Args:
+            role_dir: Répertoire du rôle
+            role_vars: Variables du rôle
+
+        Returns:
+            Demande de connexions
+        """
+        values = role_vars.get("values_files") or {}
+        # Base embarquée dans le chart: hors postgresql-service
+        if (values.get("postgresql") or {}).get("enabled"):
+            return []
+        scaling = self._merge_vars(
+            role_vars.get("chartsgouv_scaling_defaults") or {},
+            values.get("scaling") or {},
+        )
+        processes = {}
+        for tier, per_pod in (
+            ("node", "gunicorn_workers"),
+            ("worker", "celery_concurrency"),
+        ):
+            tier_scaling = scaling.get(tier) or {}
+            replicas = (
+                "max_replicas" if tier_scaling.get("autoscaling") else "min_replicas"
+            )
+            pods = int(tier_scaling.get(replicas) or 1)
+            processes[tier] = self._surge(pods) * int(tier_scaling.get(per_pod) or 1)
+        max_db_connections = int(scaling.get("max_db_connections") or 90)
+        share = max(
+            (max_db_connections - 2 * processes["worker"]) // processes["node"], 1
+        )
+
+        connections = (values.get("supersetNode") or {}).get("connections") or {}
+        release = self._vars_text((role_vars.get("helm") or {}).get("release_name"))
+        host = self._vars_text(connections.get("db_host"))
+        # Hôte relatif à une release non renseignée: inconnu
+        if "{{ .Release.Name }}" in host:
+            host = host.replace("{{ .Release.Name }}", release) if release else ""
+        return [
+            ConnectionDemand(
+                "chartsgouv",
+                host,
+                self._vars_text(connections.get("db_name")),
+                self._vars_text(connections.get("db_user")),
+                processes["node"] * share + processes["worker"] * 2,
+                f"{processes['node']} processus web × {share}, {processes['worker']} processus Celery × 2",  # noqa
+            )
+        ]
 
-        count = 0
-        for example_file in self.base_dir.rglob("example.main.yaml"):
-            target = example_file.parent / "main.yaml"
-            if not target.exists():
-                import shutil
+    def _airflow_connections(
+        self, role_dir: Path, role_vars: Mapping
+    ) -> List[ConnectionDemand]:
+        """
+        Estime les connexions d'Airflow (metadataConnection)
 
-                shutil.copy2(example_file, target)
-                print(
-                    f"{Colors.OKGREEN}✓{Colors.ENDC} Créé: {target.relative_to(self.base_dir)}"
-                )
-                count += 1
-            else:
-                print(
-                    f"{Colors.WARNING}→{Colors.ENDC} Existe déjà: {target.relative_to(self.base_dir)}"  # noqa
-                )
+        Chaque processus (scheduler, workers de l'API server, dag processor,
+        triggerer) a son pool SQLAlchemy; chaque tâche Celery écrit son
+        résultat en base. Le PgBouncer du chart, s'il est activé, plafonne le
+        tout.
 
-        print(f"\n{Colors.OKGREEN}{count} fichier(s) créé(s){Colors.ENDC}\n")
+        Args:
+            role_dir: Répertoire du rôle
+            role_vars: Variables du rôle
 
-    def _run_playbook(
-        self,
-        playbook_name: str,
-        inventory: str = "localhost",
-        extra_vars: Mapping | None = None,
-        tags: List[str] | None = None,
-        skip_tags: List[str] | None = None,
-        dry_run: bool = False,
-        verbose: int = 0,
-    ) -> Tuple[str, int, str, str]:
+        Returns:
+            Demande de connexions
         """
-        Exécute un playbook Ansible
+        values = self._render_values(role_dir, role_vars)
+        if not values or (values.get("postgresql") or {}).get("enabled"):
+            return []
+        metadata = (values.get("data") or {}).get("metadataConnection") or {}
+
+        def demand(connections: int, detail: str) -> List[ConnectionDemand]:
+            return [
+                ConnectionDemand(
+                    "airflow",
+                    self._vars_text(metadata.get("host")),
+                    self._vars_text(metadata.get("db")),
+                    self._vars_text(metadata.get("user")),
+                    connections,
+                    detail,
+                )
+            ]
+
+        pgbouncer = values.get("pgbouncer") or {}
+        if pgbouncer.get("enabled"):
+            pools = int(pgbouncer.get("metadataPoolSize") or 10) + int(
+                pgbouncer.get("resultBackendPoolSize") or 5
+            )
+            return demand(pools, "PgBouncer du chart")
+
+        env = {
+            str(var.get("name")): var.get("value")
+            for var in values.get("env") or []
+            if isinstance(var, dict)
+        }
+
+        def setting(section: str, key: str, default: int) -> int:
+            config = (values.get("config") or {}).get(section) or {}
+            value = env.get(
+                f"AIRFLOW__{section.upper()}__{key.upper()}", config.get(key)
+            )
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return default
+
+        def pods(component: str, surge: bool) -> int:
+            settings = values.get(component) or {}
+            if settings.get("enabled") is False:
+                return 0
+            replicas = int(settings.get("replicas") or 1)
+            return self._surge(replicas) if surge else replicas
+
+        per_process = setting("database", "sql_alchemy_pool_size", 5) + setting(
+            "database", "sql_alchemy_max_overflow", 10
+        )
+        processes = (
+            pods("scheduler", True)
+            + pods("apiServer", True) * setting("api", "workers", 4)
+            + pods("dagProcessor", True)
+            + pods("triggerer", False)
+        )
+        connections = processes * per_process
+        detail = f"{processes} processus × {per_process}"
+        if "Celery" in str(values.get("executor", "CeleryExecutor")):
+            tasks = pods("workers", False) * setting("celery", "worker_concurrency", 16)
+            connections += tasks
+            detail += f", {tasks} tâches Celery × 1"
+        return demand(connections, detail)
+
+    def _n8n_connections(
+        self, role_dir: Path, role_vars: Mapping
+    ) -> List[ConnectionDemand]:
+        """
+        Estime les connexions de n8n (db.postgresdb.poolSize)
 
         Args:
-            playbook_name: Nom du playbook
-            inventory: Fichier d'inventaire ou hôte
-            extra_vars: Variables supplémentaires
-            tags: Tags à exécuter
-            skip_tags: Tags à ignorer
-            dry_run: Mode simulation (--check)
-            verbose: Niveau de verbosité (0-3)
+            role_dir: Répertoire du rôle
+            role_vars: Variables du rôle
 
         Returns:
-            Tuple (playbook_name, return_code, stdout, stderr)
+            Demande de connexions
         """
-        if playbook_name not in self.playbooks:
-            return (playbook_name, 1, "", f"Playbook '{playbook_name}' non trouvé")
+        values = self._render_values(role_dir, role_vars)
+        db = values.get("db") or {}
+        if db.get("type", "postgresdb") != "postgresdb" or (
+            values.get("postgresql") or {}
+        ).get("enabled"):
+            return []
+        external = values.get("externalPostgresql") or {}
+        config = (
+            ((role_vars.get("values_files") or {}).get("config") or {}).get("db") or {}
+        ).get("postgresdb") or {}
+        pool = int((db.get("postgresdb") or {}).get("poolSize") or 2)
+
+        # Le pod principal, plus les workers et webhooks en mode queue
+        processes = int((values.get("main") or {}).get("count") or 1)
+        for component in ("worker", "webhook"):
+            settings = values.get(component) or {}
+            if settings.get("mode") == "queue":
+                processes += int(settings.get("count") or 1)
+        return [
+            ConnectionDemand(
+                "n8n",
+                self._vars_text(external.get("host"))
+                or self._vars_text(config.get("host")),
+                self._vars_text(external.get("database"))
+                or self._vars_text(config.get("database")),
+                self._vars_text(external.get("username"))
+                or self._vars_text(config.get("username")),
+                processes * pool,
+                f"{processes} pods × {pool}",
+            )
+        ]
 
-        playbook_path = self.base_dir / self.playbooks[playbook_name]["path"]
+    def _polaris_connections(
+        self, role_dir: Path, role_vars: Mapping
+    ) -> List[ConnectionDemand]:
+        """
+        Estime les connexions de Polaris (persistance relational-jdbc)
 
-        cmd = ["ansible-playbook", "-i", inventory, str(playbook_path)]
+        Args:
+            role_dir: Répertoire du rôle
+            role_vars: Variables du rôle
 
-        if dry_run:
-            cmd.append("--check")
+        Returns:
+            Demande de connexions
+        """
+        import re
+
+        values = self._render_values(role_dir, role_vars)
+        if (values.get("persistence") or {}).get("type") != "relational-jdbc":
+            return []
+        secret = (role_vars.get("secret") or {}).get("db") or {}
+        url = re.match(
+            r"jdbc:postgresql://([^/:?]+)(?::\d+)?/([^?]+)",
+            str(secret.get("jdbcUrl") or ""),
+        )
+        autoscaling = values.get("autoscaling") or {}
+        if autoscaling.get("enabled"):
+            pods = int(autoscaling.get("maxReplicas") or 1)
+        else:
+            pods = int(values.get("replicaCount") or 1)
+        pods = self._surge(pods)
+        # Taille maximale du pool Agroal de Quarkus (défaut: 20)
+        pool = int(
+            (values.get("advancedConfig") or {}).get("quarkus.datasource.jdbc.max-size")
+            or 20
+        )
+        return [
+            ConnectionDemand(
+                "polaris",
+                url.group(1) if url else "",
+                url.group(2) if url else "",
+                self._vars_text(secret.get("username")),
+                pods * pool,
+                f"{pods} pods × {pool}",
+            )
+        ]
 
-        if verbose > 0:
-            cmd.append("-" + "v" * min(verbose, 4))
+    def _postgres_target(self, host: str, releases: Iterable[str]) -> str | None:
+        """
+        Trouve la release postgresql-service derrière un hôte
 
-        if extra_vars:
-            cmd.extend(["--extra-vars", json.dumps(extra_vars)])
+        Args:
+            host: Hôte Postgres d'une application (service Kubernetes)
+            releases: Releases déployées par postgresql-service
 
-        if tags:
-            cmd.extend(["--tags", ",".join(tags)])
+        Returns:
+            Nom de la release, None si l'hôte n'en fait pas partie
+        """
+        service = host.split(".")[0]
+        for release in releases:
+            # Nom complet des services du chart Bitnami
+            fullname = release if "postgresql" in release else f"{release}-postgresql"
+            if service in (release, fullname, f"{fullname}-hl", f"{fullname}-primary"):
+                return release
+        return None
+
+    def plan_connections(self) -> Tuple[Dict[str, Dict], List[str]]:
+        """
+        Calcule au pire cas les connexions Postgres de chaque application
 
-        if skip_tags:
-            cmd.extend(["--skip-tags", ",".join(skip_tags)])
+        Les variables (vars/main.yaml) et templates de values de chaque rôle
+        applicatif sont lus; les demandes sont regroupées par release
+        postgresql-service, dont le budget est primary.max_connections.
 
-        start_time = datetime.now()
-        print(
-            f"{Colors.OKCYAN}[{start_time.strftime('%H:%M:%S')}] Démarrage: {playbook_name}{Colors.ENDC}"  # noqa
-        )
+        Returns:
+            Tuple (cible -> {"max_connections": budget ou None si l'hôte est
+            hors postgresql-service, "demands": [ConnectionDemand]},
+            avertissements)
+        """
+        notes = []
+        targets: Dict[str, Dict] = {}
+        role_dir = self._role_dir(self.POSTGRES_ROLE)
+        postgres_vars = self._role_vars(role_dir) if role_dir else None
+        if postgres_vars is None:
+            notes.append("postgresql-service: vars/main.yaml absent, budgets inconnus")
+        for database in (postgres_vars or {}).get("databases") or []:
+            primary = database.get("primary") or {}
+            targets[str(database.get("release_name"))] = {
+                "max_connections": int(
+                    primary.get("max_connections") or self.PG_MAX_CONNECTIONS
+                ),
+                "demands": [],
+            }
+
+        for role, estimator in self.CONNECTION_ROLES.items():
+            role_dir = self._role_dir(role)
+            if role_dir is None:
+                continue
+            role_vars = self._role_vars(role_dir)
+            if role_vars is None:
+                notes.append(f"{role}: vars/main.yaml absent ou illisible, ignoré")
+                continue
+            for demand in getattr(self, estimator)(role_dir, role_vars):
+                if not demand.host:
+                    notes.append(f"{demand.app}: hôte Postgres non renseigné, ignoré")
+                    continue
+                target = self._postgres_target(demand.host, targets) or demand.host
+                targets.setdefault(target, {"max_connections": None, "demands": []})
+                targets[target]["demands"].append(demand)
+        return targets, notes
+
+    def _pgbouncer_pools(
+        self, demands: List[ConnectionDemand], budget: int
+    ) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        """
+        Répartit un budget de connexions entre les pools PgBouncer
 
-        try:
-            result = subprocess.run(
-                cmd, cwd=self.base_dir, capture_output=True, text=True
-            )
+        PgBouncer ouvre un pool par couple (base, utilisateur): chacun reçoit
+        une part du budget proportionnelle à sa demande.
 
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+        Args:
+            demands: Demandes de connexions d'une release
+            budget: Connexions disponibles sur la release
 
-            if result.returncode == 0:
-                print(
-                    f"{Colors.OKGREEN}[{end_time.strftime('%H:%M:%S')}] ✓ Succès: {playbook_name} ({duration:.1f}s){Colors.ENDC}"  # noqa
-                )
+        Returns:
+            Dictionnaire (base, utilisateur) -> (pool_size, clients)
+        """
+        clients: Dict[Tuple[str, str], int] = {}
+        for demand in demands:
+            key = (demand.database, demand.user)
+            clients[key] = clients.get(key, 0) + demand.connections
+        total = sum(clients.values()) or 1
+        return {
+            key: (max(1, budget * count // total), count)
+            for key, count in clients.items()
+        }
+
+    def show_connection_plan(
+        self, targets: Mapping[str, Mapping], notes: List[str]
+    ) -> bool:
+        """
+        Affiche le budget de connexions Postgres et les pools PgBouncer conseillés
+
+        Args:
+            targets: Cibles calculées par plan_connections
+            notes: Avertissements de plan_connections
+
+        Returns:
+            True si aucune release postgresql-service ne dépasse son budget
+        """
+        within_budget = True
+        print(
+            f"{Colors.HEADER}{Colors.BOLD}Budget de connexions Postgres:{Colors.ENDC}"
+        )
+        for target, plan in targets.items():
+            demands = plan["demands"]
+            max_connections = plan["max_connections"]
+            total = sum(demand.connections for demand in demands)
+            if max_connections is None:
+                header = f"{target} (hors postgresql-service)"
             else:
+                header = f"{target} (max_connections: {max_connections}, dont {self.PG_RESERVED_CONNECTIONS} réservées)"  # noqa
+            print(f"\n  {Colors.BOLD}{header}{Colors.ENDC}")
+            for demand in demands:
+                pool = f"{demand.database}/{demand.user}"
                 print(
-                    f"{Colors.FAIL}[{end_time.strftime('%H:%M:%S')}] ✗ Échec: {playbook_name} ({duration:.1f}s){Colors.ENDC}"  # noqa
+                    f"    {demand.app:<12} {pool:<24} {demand.connections:>5}  ({demand.detail})"  # noqa
                 )
-
-            return (playbook_name, result.returncode, result.stdout, result.stderr)
-
-        except Exception as e:
-            end_time = datetime.now()
+            if max_connections is None:
+                print(f"    Total: {total}")
+                continue
+
+            budget = max_connections - self.PG_RESERVED_CONNECTIONS
+            if total <= budget:
+                print(f"    {Colors.OKGREEN}✓ Total: {total} / {budget}{Colors.ENDC}")
+                continue
+            within_budget = False
+            print(
+                f"    {Colors.FAIL}✗ Total: {total} / {budget} (dépassement: {total - budget}){Colors.ENDC}"  # noqa
+            )
             print(
-                f"{Colors.FAIL}[{end_time.strftime('%H:%M:%S')}] ✗ Erreur: {playbook_name} - {str(e)}{Colors.ENDC}"  # noqa
+                f"    PgBouncer conseillé (pool_mode=transaction, max_client_conn={total}, max_db_connections={budget}):"  # noqa
             )
-            return (playbook_name, 1, "", str(e))
+            for (database, user), (size, clients) in self._pgbouncer_pools(
+                demands, budget
+            ).items():
+                print(f"      {database}/{user}: pool_size={size} ({clients} clients)")
 
-    def run_playbooks(
-        self,
-        playbook_names: List[str],
-        parallel: bool = False,
-        max_workers: int = 4,
-        **kwargs,
-    ) -> List[Tuple[str, int, str, str]]:
+        if notes:
+            print()
+        for note in notes:
+            print(f"  {Colors.WARNING}⚠ {note}{Colors.ENDC}")
+        print()
+        return within_budget
+
+    def check_connections(self, playbook_names: List[str]) -> bool:
         """
-        Exécute un ou plusieurs playbooks
+        Vérifie le budget de connexions Postgres avant un déploiement
+
+        La vérification n'a lieu que si un des playbooks utilise un rôle
+        applicatif connecté à Postgres ou postgresql-service.
 
         Args:
-            playbook_names: Liste des noms de playbooks
-            parallel: Exécution parallèle
-            max_workers: Nombre de workers pour l'exécution parallèle
-            **kwargs: Arguments passés à _run_playbook
+            playbook_names: Playbooks à déployer (dépendances comprises)
 
         Returns:
-            Liste des résultats (playbook_name, return_code, stdout, stderr)
+            False si une release postgresql-service dépasse son budget
         """
-        # Résoudre les dépendances et l'ordre
-        ordered_playbooks = self._resolve_dependencies(playbook_names)
+        watched = {
+            self._role_dir(role)
+            for role in (*self.CONNECTION_ROLES, self.POSTGRES_ROLE)
+        }
+        used = {
+            role_dir
+            for name in playbook_names
+            for role_dir in self._playbook_roles(
+                self.base_dir / self.playbooks[name]["path"]
+            )
+        }
+        if not used & (watched - {None}):
+            return True
+        return self.show_connection_plan(*self.plan_connections())
 
-        print(f"\n{Colors.HEADER}{Colors.BOLD}Plan d'exécution:{Colors.ENDC}")
-        for i, name in enumerate(ordered_playbooks, 1):
-            print(f"  {i}. {name}")
-        print()
+    def _load_deployed(self) -> Dict[str, Dict[str, str]]:
+        """
+        Charge les empreintes des derniers déploiements réussis
 
-        results = []
+        Returns:
+            Dictionnaire inventaire -> {playbook: empreinte}
+        """
+        import json
 
-        if parallel and len(ordered_playbooks) > 1:
-            print(
-                f"{Colors.BOLD}Mode parallèle activé (max {max_workers} workers){Colors.ENDC}\n"
-            )
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=max_workers
-            ) as executor:
-                futures = {
-                    executor.submit(self._run_playbook, name, **kwargs): name
-                    for name in ordered_playbooks
-                }
-                for future in concurrent.futures.as_completed(futures):
-                    results.append(future.result())
-        else:
-            print(f"{Colors.BOLD}Mode séquentiel{Colors.ENDC}\n")
-            for name in ordered_playbooks:
-                print(kwargs)
-                results.append(self._run_playbook(name, **kwargs))
+        try:
+            with open(self.deployed_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
 
-        return results
+    def _save_deployed(self, inventory: str, playbook_name: str, checksum: str) -> None:
+        """
+        Enregistre l'empreinte d'un déploiement réussi
+
+        Args:
+            inventory: Inventaire utilisé
+            playbook_name: Nom du playbook
+            checksum: Empreinte des entrées du playbook
+        """
+        deployed = self._load_deployed()
+        deployed.setdefault(inventory, {})[playbook_name] = checksum
+        try:
+            self._write_json(self.deployed_file, deployed)
+        except OSError as e:
+            print(
+                f"{Colors.WARNING}État de déploiement non enregistré ({self.deployed_file}): {e}{Colors.ENDC}"  # noqa
+            )
 
     def _resolve_dependencies(self, playbook_names: List[str]) -> List[str]:
         """
@@ -271,10 +3572,12 @@ class AnsibleCLI:
         """
         resolved = []
         seen = set()
+        visiting = set()
 
         def add_with_deps(name: str) -> None:
-            if name in seen or name not in self.playbooks:
+            if name in seen or name in visiting or name not in self.playbooks:
                 return
+            visiting.add(name)
 
             # Ajouter d'abord les dépendances
             for dep in self.playbooks[name].get("requires", []):
@@ -289,7 +3592,7 @@ class AnsibleCLI:
 
         return resolved
 
-    def print_summary(self, results: List[Tuple[str, int, str, str]]) -> None:
+    def print_summary(self, results: List[PlaybookResult]) -> None:
         """
         Affiche un résumé des exécutions
 
@@ -300,22 +3603,79 @@ class AnsibleCLI:
         print(f"{Colors.HEADER}{Colors.BOLD}RÉSUMÉ{Colors.ENDC}")
         print(f"{Colors.HEADER}{Colors.BOLD}{'='*60}{Colors.ENDC}\n")
 
-        success_count = sum(1 for _, rc, _, _ in results if rc == 0)
-        fail_count = len(results) - success_count
-
-        for name, return_code, stdout, stderr in results:
-            status = (
-                f"{Colors.OKGREEN}✓ SUCCÈS{Colors.ENDC}"
-                if return_code == 0
-                else f"{Colors.FAIL}✗ ÉCHEC{Colors.ENDC}"
-            )
-            print(f"  {status} - {name}")
-
-            if return_code != 0 and stderr:
-                print(f"{Colors.FAIL}  Erreur: {stderr}{Colors.ENDC}")
+        success_count = sum(1 for result in results if result.status == Status.SUCCESS)
+        skipped_count = sum(1 for result in results if result.status == Status.SKIPPED)
+        unchanged_count = sum(
+            1 for result in results if result.status == Status.UNCHANGED
+        )
+        cancelled_count = sum(
+            1 for result in results if result.status == Status.CANCELLED
+        )
+        fail_count = (
+            len(results)
+            - success_count
+            - skipped_count
+            - unchanged_count
+            - cancelled_count
+        )
 
+        # Déploiement multi-inventaires: résultats regroupés par inventaire
+        inventories = list(dict.fromkeys(result.inventory for result in results))
+        if len(inventories) > 1:
+            labels = self._inventory_labels(inventories)
+            results = sorted(results, key=lambda r: inventories.index(r.inventory))
+
+        current = None
+        for result in results:
+            if len(inventories) > 1 and result.inventory != current:
+                current = result.inventory
+                group = [r for r in results if r.inventory == current]
+                ok = sum(1 for r in group if r.returncode == 0)
+                color = Colors.OKGREEN if ok == len(group) else Colors.FAIL
+                print(
+                    f"{Colors.BOLD}Inventaire {labels[current]}{Colors.ENDC} ({color}{ok}/{len(group)} OK{Colors.ENDC})"  # noqa
+                )
+            if result.status == Status.SUCCESS:
+                status = f"{Colors.OKGREEN}✓ SUCCÈS{Colors.ENDC}"
+            elif result.status == Status.SKIPPED:
+                status = f"{Colors.WARNING}⊘ IGNORÉ{Colors.ENDC}"
+            elif result.status == Status.UNCHANGED:
+                status = f"{Colors.OKCYAN}= INCHANGÉ{Colors.ENDC}"
+            elif result.status == Status.CANCELLED:
+                status = f"{Colors.WARNING}■ ANNULÉ{Colors.ENDC}"
+            else:
+                status = f"{Colors.FAIL}✗ ÉCHEC{Colors.ENDC}"
+            print(f"  {status} - {result.name}")
+
+            if result.status in (Status.SKIPPED, Status.CANCELLED):
+                print(f"{Colors.WARNING}  {result.message}{Colors.ENDC}")
+                if result.stdout_log:
+                    print(f"  Log: {result.stdout_log}")
+            elif result.returncode != 0:
+                # Tâches en échec si elles ont été identifiées, sinon fin du
+                # flux d'erreur (ex: erreur de syntaxe du playbook)
+                for failure in result.failures:
+                    print(f"  Tâche: {failure.task} [{failure.host}]")
+                    print(f"{Colors.FAIL}  Erreur: {failure.message}{Colors.ENDC}")
+                errors = []
+                if not result.failures:
+                    errors = self._tail(result.stderr_log, self.SUMMARY_TAIL_LINES)
+                if result.message:
+                    errors.append(result.message)
+                if errors:
+                    print(f"{Colors.FAIL}  Erreur: {chr(10).join(errors)}{Colors.ENDC}")
+                if result.stdout_log:
+                    print(f"  Log: {result.stdout_log}")
+
+        unchanged = (
+            f" | Inchangés: {Colors.OKCYAN}{unchanged_count}{Colors.ENDC}"
+            if unchanged_count
+            else ""
+        )
+        if cancelled_count:
+            unchanged += f" | Annulés: {Colors.WARNING}{cancelled_count}{Colors.ENDC}"
         print(
-            f"\n{Colors.BOLD}Total: {len(results)} | Succès: {Colors.OKGREEN}{success_count}{Colors.ENDC} | Échecs: {Colors.FAIL}{fail_count}{Colors.ENDC}\n"  # noqa
+            f"\n{Colors.BOLD}Total: {len(results)} | Succès: {Colors.OKGREEN}{success_count}{Colors.ENDC} | Échecs: {Colors.FAIL}{fail_count}{Colors.ENDC} | Ignorés: {Colors.WARNING}{skipped_count}{Colors.ENDC}{unchanged}\n"  # noqa
         )
 
 
@@ -323,6 +3683,11 @@ class AnsibleCLI:
 pass_cli = click.make_pass_decorator(AnsibleCLI, ensure=True)
 
 
+def complete_playbooks(ctx, param, incomplete: str) -> List[str]:
+    """Complétion shell des noms de playbooks (lue depuis l'index en cache)"""
+    return [name for name in AnsibleCLI().playbooks if name.startswith(incomplete)]
+
+
 @click.group(invoke_without_command=True)
 @click.pass_context
 def cli(ctx) -> None:
@@ -331,7 +3696,8 @@ def cli(ctx) -> None:
     Supporte l'exécution parallèle, la gestion des dépendances et
     la découverte automatique des playbooks.
     """
-    # Initialiser le CLI et le stocker dans le contexte
+    # Initialiser le CLI et le stocker dans le contexte (la découverte des
+    # playbooks n'a lieu qu'au premier accès à .playbooks)
     ctx.obj = AnsibleCLI()
 
     # Si aucune commande n'est fournie, afficher l'aide
@@ -355,8 +3721,18 @@ def duplicate(cli_obj) -> None:
 
 
 @cli.command()
-@click.argument("playbooks", nargs=-1)
-@click.option("--all", is_flag=True, help="Exécuter tous les playbooks")
+@click.argument("playbooks", nargs=-1, shell_complete=complete_playbooks)
+@click.option(
+    "-i", "--inventory", help="Ne retenir que les exécutions sur cet inventaire"
+)
+@pass_cli
+def history(cli_obj, playbooks, inventory) -> None:
+    """Affiche les durées p50/p95 et la tendance de chaque playbook."""
+    cli_obj.show_history(inventory=inventory, playbook_names=list(playbooks))
+
+
+@cli.command()
+@click.argument("playbook", shell_complete=complete_playbooks)
 @click.option(
     "-i",
     "--inventory",
@@ -367,31 +3743,175 @@ def duplicate(cli_obj) -> None:
     "-e", "--extra-vars", type=str, help="Variables supplémentaires (format JSON)"
 )
 @click.option("-t", "--tags", help="Tags à exécuter (séparés par des virgules)")
+@click.option("-c", "--dry-run", is_flag=True, help="Mode simulation (--check)")
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Fichier collapsed stack (défaut: <logs>/<playbook>.collapsed)",
+)
+@click.option(
+    "--perf-profile",
+    type=click.Choice(AnsibleCLI.PERF_PROFILES),
+    default="default",
+    show_default=True,
+    help="Réglages d'ansible-playbook (fast: pipelining, cache de faits, forks)",
+)
+@pass_cli
+def profile(
+    cli_obj, playbook, inventory, extra_vars, tags, dry_run, output, perf_profile
+) -> None:
+    """Exécute un playbook et affiche le temps passé par rôle, tâche et module.
+
+    Le fichier collapsed stack s'ouvre dans https://www.speedscope.app ou
+    avec flamegraph.pl.
+    """
+    import json
+
+    if playbook not in cli_obj.playbooks:
+        click.secho(f"Erreur: Playbook non trouvé: {playbook}", fg="red", err=True)
+        raise click.Abort()
+
+    parsed_extra_vars = None
+    if extra_vars:
+        try:
+            parsed_extra_vars = json.loads(extra_vars)
+        except json.JSONDecodeError as e:
+            click.secho(
+                f"Erreur: Format JSON invalide pour --extra-vars: {e}",
+                fg="red",
+                err=True,
+            )
+            raise click.Abort()
+
+    result = cli_obj.profile_playbook(
+        playbook,
+        collapsed_file=output,
+        inventory=inventory,
+        extra_vars=parsed_extra_vars,
+        tags=tags.split(",") if tags else None,
+        dry_run=dry_run,
+        perf_profile=perf_profile,
+    )
+    cli_obj.print_summary([result])
+
+
+@cli.command()
+@click.argument("playbooks", nargs=-1, shell_complete=complete_playbooks)
+@click.option("--all", is_flag=True, help="Exécuter tous les playbooks")
+@click.option(
+    "-i",
+    "--inventory",
+    multiple=True,
+    help="Fichier d'inventaire (défaut: localhost). Répétable pour déployer sur plusieurs inventaires",  # noqa
+)
+@click.option(
+    "--inventory-dir",
+    multiple=True,
+    help="Répertoire dont chaque fichier ou sous-répertoire est un inventaire distinct",  # noqa
+)
+@click.option(
+    "-e", "--extra-vars", type=str, help="Variables supplémentaires (format JSON)"
+)
+@click.option("-t", "--tags", help="Tags à exécuter (séparés par des virgules)")
 @click.option("--skip-tags", help="Tags à ignorer (séparés par des virgules)")
 @click.option("-p", "--parallel", is_flag=True, help="Exécution parallèle")
 @click.option(
     "--max-workers",
-    type=int,
+    type=click.IntRange(min=1),
     default=4,
-    help="Nombre de workers parallèles (défaut: 4)",
+    help="Nombre de workers parallèles, tous inventaires confondus (défaut: 4)",
+)
+@click.option(
+    "--max-per-inventory",
+    type=click.IntRange(min=1),
+    help="Nombre maximal de playbooks simultanés sur un même inventaire",
+)
+@click.option(
+    "--fail-fast/--keep-going",
+    default=False,
+    help="Au premier échec, arrêter les playbooks en cours et annuler ceux en attente (défaut: --keep-going, seuls les dépendants sont ignorés)",  # noqa
 )
 @click.option("-c", "--dry-run", is_flag=True, help="Mode simulation (--check)")
 @click.option("-v", "--verbose", count=True, help="Niveau de verbosité (-v, -vv, -vvv)")
 @click.option("--show-output", is_flag=True, help="Afficher la sortie complète")
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Afficher la sortie des playbooks en temps réel (préfixée par [playbook])",
+)
+@click.option(
+    "--progress",
+    is_flag=True,
+    help="Afficher le démarrage de chaque tâche (préfixé par [playbook])",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(AnsibleCLI.ENGINES),
+    default="thread",
+    show_default=True,
+    help="Moteur d'exécution des playbooks",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Durée maximale d'exécution d'un playbook (secondes)",
+)
+@click.option(
+    "--changed-only",
+    is_flag=True,
+    help="N'exécuter que les playbooks dont les entrées ont changé depuis leur dernier déploiement réussi",  # noqa
+)
+@click.option(
+    "--helm-repo-ttl",
+    type=float,
+    default=AnsibleCLI.HELM_REPO_TTL,
+    show_default=True,
+    help="Durée (secondes) pendant laquelle un index de dépôt Helm rafraîchi est réutilisé",  # noqa
+)
+@click.option(
+    "--no-values-cache",
+    is_flag=True,
+    help="Toujours relancer l'upgrade Helm, même si les values rendues n'ont pas changé",  # noqa
+)
+@click.option(
+    "--perf-profile",
+    type=click.Choice(AnsibleCLI.PERF_PROFILES),
+    default="default",
+    show_default=True,
+    help="Réglages d'ansible-playbook (fast: pipelining, cache de faits, forks)",
+)
+@click.option(
+    "--skip-connection-check",
+    is_flag=True,
+    help="Déployer même si le budget de connexions Postgres est dépassé",
+)
 @pass_cli
 def run(
     cli_obj: AnsibleCLI,
     playbooks,
     all,
     inventory,
+    inventory_dir,
     extra_vars,
     tags,
     skip_tags,
     parallel,
     max_workers,
+    max_per_inventory,
+    fail_fast,
     dry_run,
     verbose,
     show_output: bool = True,
+    stream: bool = False,
+    progress: bool = False,
+    engine: str = "thread",
+    timeout: float | None = None,
+    changed_only: bool = False,
+    helm_repo_ttl: float = AnsibleCLI.HELM_REPO_TTL,
+    no_values_cache: bool = False,
+    perf_profile: str = "default",
+    skip_connection_check: bool = False,
 ) -> None:
     """Exécute un ou plusieurs playbooks.
 
@@ -416,7 +3936,34 @@ def run(
     \b
       # Avec variables supplémentaires
       ansible_cli.py run airflow -e '{"version": "2.0"}'
+
+    \b
+      # Redéployer uniquement ce qui a changé
+      ansible_cli.py run --all --parallel --changed-only
+
+    \b
+      # Moteur asyncio avec délai maximal par playbook
+      ansible_cli.py run --all --parallel --engine asyncio --timeout 900
+
+    \b
+      # Playbooks lancés depuis des workers Ansible préchauffés
+      ansible_cli.py run --all --parallel --engine inprocess
+
+    \b
+      # Pipelining, cache de faits et forks ajustés
+      ansible_cli.py run --all --parallel --perf-profile fast
+
+    \b
+      # Tout arrêter dès le premier playbook en échec
+      ansible_cli.py run --all --parallel --fail-fast
+
+    \b
+      # Déployer sur plusieurs clusters, 2 playbooks au plus par cluster
+      ansible_cli.py run --all --parallel -i inventories/dev -i inventories/prod \\
+        --max-workers 8 --max-per-inventory 2
     """
+    import json
+
     if not playbooks and not all:
         click.secho(
             "Erreur: Spécifiez des playbooks ou utilisez --all", fg="red", err=True
@@ -447,37 +3994,93 @@ def run(
             )
             raise click.Abort()
 
+    inventories = list(inventory)
+    for directory in inventory_dir:
+        try:
+            inventories.extend(cli_obj._expand_inventory_dir(directory))
+        except FileNotFoundError as e:
+            click.secho(f"Erreur: {e}", fg="red", err=True)
+            raise click.Abort()
+    if inventory_dir and not inventories:
+        click.secho("Erreur: Aucun inventaire trouvé", fg="red", err=True)
+        raise click.Abort()
+
+    # Vérifier le budget de connexions Postgres avant tout déploiement
+    if not skip_connection_check and not cli_obj.check_connections(
+        cli_obj._resolve_dependencies(playbook_names)
+    ):
+        click.secho(
+            "Erreur: Budget de connexions Postgres dépassé (--skip-connection-check pour passer outre)",  # noqa
+            fg="red",
+            err=True,
+        )
+        sys.exit(1)
+
     # Exécuter
     results = cli_obj.run_playbooks(
         playbook_names,
         parallel=parallel,
         max_workers=max_workers,
-        inventory=inventory,
+        inventories=inventories or ["localhost"],
+        max_per_inventory=max_per_inventory,
+        fail_fast=fail_fast,
         extra_vars=parsed_extra_vars,
         tags=tags.split(",") if tags else None,
         skip_tags=skip_tags.split(",") if skip_tags else None,
         dry_run=dry_run,
         verbose=verbose,
+        stream=stream,
+        progress=progress,
+        engine=engine,
+        timeout=timeout,
+        changed_only=changed_only,
+        helm_repo_ttl=helm_repo_ttl,
+        values_cache=not no_values_cache,
+        perf_profile=perf_profile,
     )
 
     # Afficher les sorties si demandé
     if show_output:
-        print(f"\n{Colors.HEADER}{Colors.BOLD}SORTIE DÉTAILLÉE{Colors.ENDC}\n")
-        for name, rc, stdout, stderr in results:
-            print(f"\n{Colors.BOLD}=== {name} ==={Colors.ENDC}")
-            if stdout:
-                print(stdout)
-            if stderr:
-                print(f"{Colors.FAIL}{stderr}{Colors.ENDC}")
+        cli_obj.show_output(results)
 
     # Afficher le résumé
     cli_obj.print_summary(results)
 
     # Code de sortie
-    if any(rc != 0 for _, rc, _, _ in results):
+    if any(result.returncode != 0 for result in results):
+        sys.exit(1)
+
+
+@cli.group()
+def plan() -> None:
+    """Vérifie les ressources partagées avant un déploiement."""
+
+
+@plan.command()
+@pass_cli
+def connections(cli_obj) -> None:
+    """Calcule les connexions Postgres de chaque application.
+
+    Lit les variables et templates de values des rôles airflow, chartsgouv,
+    n8n et polaris, et compare leur demande au pire cas (replicas maximaux,
+    pools pleins, rolling update) au max_connections de chaque release
+    postgresql-service. En cas de dépassement, propose des tailles de pools
+    PgBouncer et sort en erreur.
+
+    \b
+      ansible_cli.py plan connections
+    """
+    if not cli_obj.show_connection_plan(*cli_obj.plan_connections()):
         sys.exit(1)
 
 
+@cli.command("warm-worker", hidden=True)
+@click.argument("fd", type=int)
+def warm_worker(fd) -> None:
+    """Worker préchauffé du moteur inprocess (lancé par le CLI)."""
+    serve_warm_worker(fd)
+
+
 def main() -> None:
     """Point d'entrée principal du CLI"""
     cli()
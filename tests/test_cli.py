@@ -1 +1,791 @@
-""" CLI Test Cases """
\ No newline at end of file
+"""CLI Test Cases"""
+
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from cli import (  # noqa: E402
+    AnsibleCLI,
+    DependencyScheduler,
+    FailureParser,
+    PlaybookResult,
+    Status,
+)
+
+
+def make_helm_project(base_dir, repos):
+    """Crée un projet minimal avec un playbook et un rôle par dépôt Helm"""
+    (base_dir / "ansible" / "playbooks").mkdir(parents=True)
+    config = "playbooks:\n"
+    for name, url in repos.items():
+        role_vars = base_dir / "ansible" / "roles" / "apps" / name / "vars"
+        role_vars.mkdir(parents=True)
+        (role_vars / "main.yaml").write_text(
+            f"helm:\n  repo_name: {name}\n  repo_url: {url}\n"
+        )
+        (base_dir / "ansible" / "playbooks" / f"{name}.yaml").write_text(
+            f"- hosts: localhost\n  roles:\n    - {{ role: apps/{name} }}\n"
+        )
+        config += f"  {name}:\n    order: 1\n"
+    (base_dir / "ansible" / "playbooks.yaml").write_text(config)
+    return AnsibleCLI(str(base_dir))
+
+
+def test_scheduler_starts_dependents_after_success():
+    scheduler = DependencyScheduler(
+        ["db", "app", "other"], {"app": ["db"], "db": [], "other": []}
+    )
+
+    assert scheduler.next_ready(4) == ["db", "other"]
+    assert scheduler.next_ready(4) == []
+
+    scheduler.complete("db", True)
+    assert scheduler.next_ready(4) == ["app"]
+
+    scheduler.complete("app", True)
+    scheduler.complete("other", True)
+    assert scheduler.finished
+
+
+def test_scheduler_respects_free_slots():
+    scheduler = DependencyScheduler(["a", "b", "c"], {})
+
+    assert scheduler.next_ready(2) == ["a", "b"]
+    assert scheduler.next_ready(0) == []
+
+
+def test_scheduler_limits_nodes_per_group():
+    nodes = ["a@dev", "a@prod", "b@dev", "b@prod"]
+    scheduler = DependencyScheduler(
+        nodes,
+        {},
+        groups={node: node.split("@")[1] for node in nodes},
+        group_limit=1,
+    )
+
+    assert scheduler.next_ready(4) == ["a@dev", "a@prod"]
+    assert scheduler.next_ready(4) == []
+
+    scheduler.complete("a@prod", True)
+    assert scheduler.next_ready(4) == ["b@prod"]
+
+
+def test_scheduler_skips_dependents_of_failure():
+    scheduler = DependencyScheduler(
+        ["db", "users", "app", "other"],
+        {"users": ["db"], "app": ["users"], "other": []},
+    )
+    scheduler.next_ready(4)
+    scheduler.complete("db", False)
+
+    assert [node for node, _ in scheduler.pop_skipped()] == ["users", "app"]
+    scheduler.complete("other", True)
+    assert scheduler.finished
+
+
+def test_scheduler_starts_critical_path_first():
+    scheduler = DependencyScheduler(
+        ["db", "short", "long", "after_long"],
+        {"after_long": ["long"]},
+        {"db": 5, "short": 30, "long": 20, "after_long": 20},
+    )
+
+    assert scheduler.next_ready(1) == ["long"]
+    assert scheduler.next_ready(1) == ["short"]
+
+
+def test_discovery_index_is_rebuilt_when_playbooks_change(tmp_path):
+    playbooks_dir = tmp_path / "ansible" / "playbooks"
+    playbooks_dir.mkdir(parents=True)
+    (playbooks_dir / "db.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text(
+        "playbooks:\n  db:\n    order: 1\n"
+    )
+
+    assert list(AnsibleCLI(str(tmp_path)).playbooks) == ["db"]
+    assert (tmp_path / ".ansible_cli" / "playbooks_index.json").exists()
+
+    (playbooks_dir / "app.yaml").write_text("---\n")
+    os.utime(playbooks_dir, ns=(0, 0))
+
+    assert list(AnsibleCLI(str(tmp_path)).playbooks) == ["db", "app"]
+
+
+def test_history_records_runs_and_reports_percentiles(tmp_path, capsys):
+    cli_obj = AnsibleCLI(str(tmp_path))
+    for duration in [10.0, 20.0, 30.0, 40.0]:
+        result = PlaybookResult("db", 0, Status.SUCCESS, duration=duration)
+        cli_obj._record_run(result, "prod", False, tags=["database"], checksum="abc")
+
+    # Une exécution par jour pour que la tendance soit calculée
+    records = cli_obj._load_history()
+    for day, record in enumerate(records, 1):
+        record["end"] = f"2026-01-0{day}T00:00:00"
+    cli_obj.history_file.write_text("".join(json.dumps(r) + "\n" for r in records))
+
+    record = cli_obj._load_history()[0]
+    assert record["tags"] == ["database"] and record["checksum"] == "abc"
+    assert record["status"] == Status.SUCCESS and "start" in record
+    assert cli_obj._percentile([10.0, 20.0, 30.0, 40.0], 95) == pytest.approx(38.5)
+
+    cli_obj.show_history(inventory="prod")
+    output = capsys.readouterr().out
+    assert "25.0s" in output and "+10.0s/j" in output
+
+
+def test_release_status_lines_are_reported_without_stream(tmp_path, capsys):
+    cli_obj = AnsibleCLI(str(tmp_path))
+    for line in [
+        "TASK [Report Postgres releases status] ***",
+        '    "msg": "helm release pg-a: deployed"',
+        '    "msg": "helm release pg-b: failed - timed out"',
+    ]:
+        cli_obj._forward_line(line, "db", echo=False, error=False)
+
+    output = capsys.readouterr().out
+    assert "TASK" not in output
+    assert "pg-a" in output and "pg-b: failed - timed out" in output
+
+
+def test_failure_parser_extracts_failed_tasks():
+    parser = FailureParser()
+    output = [
+        "TASK [Create namespace] ***",
+        'fatal: [localhost]: FAILED! => {"changed": false, "msg": "ignored"}',
+        "...ignoring",
+        "TASK [Deploy Airflow with Helm] ***",
+        "fatal: [localhost]: FAILED! => {",
+        '    "changed": false,',
+        '    "msg": "UPGRADE FAILED: timed out"',
+        "}",
+        "TASK [Grant privileges] ***",
+        'failed: [db1] (item=CONNECT) => {"msg": "role does not exist"}',
+    ]
+    for line in output:
+        parser.feed(line + "\n")
+
+    assert [tuple(f) for f in parser.failures] == [
+        ("Deploy Airflow with Helm", "localhost", "UPGRADE FAILED: timed out"),
+        ("Grant privileges (item=CONNECT)", "db1", "role does not exist"),
+    ]
+
+
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_run_collects_callback_events(tmp_path, monkeypatch, engine):
+    import asyncio
+
+    fake = tmp_path / "bin" / "ansible-playbook"
+    fake.parent.mkdir()
+    fake.write_text(
+        "#!/bin/bash\n"
+        'echo \'{"event": "task_start", "task": "Deploy", "role": "apps/db"}\' '
+        '>&"$ANSIBLE_CLI_EVENTS_FD"\n'
+        'echo \'{"event": "host_failed", "task": "Deploy", "role": "apps/db", '
+        '"host": "localhost", "msg": "boom"}\' >&"$ANSIBLE_CLI_EVENTS_FD"\n'
+        "exit 2\n"
+    )
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    (tmp_path / "ansible" / "playbooks" / "db.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text("playbooks:\n  db: {}\n")
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    if engine == "asyncio":
+        result = asyncio.run(
+            cli_obj._run_playbook_async("db", log_dir=tmp_path / "logs")
+        )
+    else:
+        result = cli_obj._run_playbook("db", log_dir=tmp_path / "logs")
+
+    assert result.failures == (("apps/db : Deploy", "localhost", "boom"),)
+    assert len(Path(result.events_log).read_text().splitlines()) == 2
+
+
+def test_asyncio_engine_follows_dependencies_and_worker_limit(tmp_path, monkeypatch):
+    log = tmp_path / "log"
+    fake = tmp_path / "bin" / "ansible-playbook"
+    fake.parent.mkdir()
+    fake.write_text(
+        "#!/bin/bash\n"
+        'name="$(basename "$3" .yaml)"\n'
+        f'echo "start $name" >> {log}\n'
+        "sleep 0.3\n"
+        f'echo "end $name" >> {log}\n'
+        '[ "$name" = bad ] && exit 2\n'
+        "exit 0\n"
+    )
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    for name in ("db", "app", "bad", "child", "other"):
+        (tmp_path / "ansible" / "playbooks" / f"{name}.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text(
+        "playbooks:\n"
+        "  db: {}\n"
+        "  app: {requires: [db]}\n"
+        "  bad: {}\n"
+        "  child: {requires: [bad]}\n"
+        "  other: {}\n"
+    )
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    results = cli_obj.run_playbooks(
+        ["app", "child", "other"], parallel=True, max_workers=2, engine="asyncio"
+    )
+
+    statuses = {result.name: result.status for result in results}
+    assert statuses == {
+        "db": Status.SUCCESS,
+        "app": Status.SUCCESS,
+        "bad": Status.FAILED,
+        "child": Status.SKIPPED,
+        "other": Status.SUCCESS,
+    }
+    events = log.read_text().split("\n")[:-1]
+    assert events.index("start app") > events.index("end db")
+    assert "start child" not in events
+    running = peak = 0
+    for event in events:
+        running += 1 if event.startswith("start") else -1
+        peak = max(peak, running)
+    assert peak == 2
+
+
+def test_stream_prefixes_output_lines(tmp_path, monkeypatch, capsys):
+    fake = tmp_path / "bin" / "ansible-playbook"
+    fake.parent.mkdir()
+    fake.write_text("#!/bin/bash\necho 'TASK [Deploy]'\necho 'oops' >&2\n")
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    (tmp_path / "ansible" / "playbooks" / "db.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text("playbooks:\n  db: {}\n")
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    result = cli_obj._run_playbook("db", stream=True, log_dir=tmp_path / "logs")
+
+    out = capsys.readouterr().out
+    assert "[db] TASK [Deploy]" in out
+    assert "[db] oops" in out
+    assert Path(result.stdout_log).read_text() == "TASK [Deploy]\n"
+    assert Path(result.stderr_log).read_text() == "oops\n"
+
+
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_timeout_is_applied_the_same_way_by_both_engines(tmp_path, monkeypatch, engine):
+    fake = tmp_path / "bin" / "ansible-playbook"
+    fake.parent.mkdir()
+    fake.write_text("#!/bin/bash\nsleep 0.5\n")
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    (tmp_path / "ansible" / "playbooks" / "db.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text("playbooks:\n  db: {}\n")
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    # 0 (comme None): pas de limite
+    (result,) = cli_obj.run_playbooks(["db"], engine=engine, timeout=0)
+    assert result.status == Status.SUCCESS
+
+    (result,) = cli_obj.run_playbooks(["db"], engine=engine, timeout=0.1)
+    assert result.status == Status.FAILED
+    assert result.message == "Délai dépassé (0.1s)"
+
+
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_fail_fast_stops_running_and_cancels_queued(tmp_path, monkeypatch, engine):
+    fake = tmp_path / "bin" / "ansible-playbook"
+    fake.parent.mkdir()
+    fake.write_text(
+        "#!/bin/bash\n"
+        'case "$(basename "$3" .yaml)" in\n'
+        "  bad) sleep 0.5; exit 2 ;;\n"
+        "  slow) sleep 30 ;;\n"
+        "esac\n"
+    )
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    for name in ("bad", "slow", "later"):
+        (tmp_path / "ansible" / "playbooks" / f"{name}.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text(
+        "playbooks:\n"
+        "  bad: {order: 1}\n"
+        "  slow: {order: 2}\n"
+        "  later: {order: 3}\n"
+    )
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    start = time.monotonic()
+    results = cli_obj.run_playbooks(
+        ["bad", "slow", "later"],
+        parallel=True,
+        max_workers=2,
+        engine=engine,
+        fail_fast=True,
+    )
+
+    assert time.monotonic() - start < 10
+    statuses = {result.name: result.status for result in results}
+    assert statuses == {
+        "bad": Status.FAILED,
+        "slow": Status.CANCELLED,
+        "later": Status.CANCELLED,
+    }
+
+
+def test_helm_values_cache_is_scoped_per_inventory(tmp_path, monkeypatch):
+    calls = tmp_path / "calls"
+    fake = tmp_path / "bin" / "ansible-playbook"
+    fake.parent.mkdir()
+    fake.write_text(f'#!/bin/bash\necho "$2 $5" >> {calls}\n')
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    (tmp_path / "ansible" / "playbooks" / "db.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text("playbooks:\n  db: {}\n")
+    (tmp_path / "inventories").mkdir()
+    for name in ("dev", "prod"):
+        (tmp_path / "inventories" / f"{name}.ini").write_text("localhost\n")
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    cli_obj.run_playbooks(
+        ["db"],
+        parallel=True,
+        inventories=["inventories/dev.ini", "inventories/prod.ini"],
+    )
+
+    cache_dirs = {}
+    for line in calls.read_text().splitlines():
+        inventory, cli_vars = line.split(" ", 1)
+        cache_dirs[inventory] = json.loads(cli_vars)["helm_values_cache_dir"]
+    assert cache_dirs == {
+        "inventories/dev.ini": str(cli_obj.helm_values_dir / "inventories_dev.ini"),
+        "inventories/prod.ini": str(cli_obj.helm_values_dir / "inventories_prod.ini"),
+    }
+
+
+def make_changed_only_project(tmp_path, monkeypatch):
+    """Crée un playbook dont le rôle inclut un rôle commun (include_role)"""
+    fake = tmp_path / "bin" / "ansible-playbook"
+    fake.parent.mkdir()
+    fake.write_text(f'#!/bin/bash\necho "$2" >> {tmp_path / "calls"}\n')
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    roles = tmp_path / "ansible" / "roles"
+    (roles / "apps" / "app" / "tasks").mkdir(parents=True)
+    (roles / "apps" / "app" / "vars").mkdir()
+    (roles / "common" / "inc" / "tasks").mkdir(parents=True)
+    (roles / "apps" / "app" / "tasks" / "main.yaml").write_text(
+        "- name: Include common role\n"
+        "  ansible.builtin.include_role:\n    name: common/inc\n"
+    )
+    (roles / "apps" / "app" / "vars" / "main.yaml").write_text("replicas: 1\n")
+    (roles / "common" / "inc" / "tasks" / "main.yaml").write_text("[]\n")
+    (tmp_path / "ansible" / "playbooks").mkdir()
+    (tmp_path / "ansible" / "playbooks" / "app.yaml").write_text(
+        "- hosts: localhost\n  roles:\n    - { role: apps/app }\n"
+    )
+    (tmp_path / "ansible" / "playbooks.yaml").write_text("playbooks:\n  app: {}\n")
+    return AnsibleCLI(str(tmp_path)), roles
+
+
+def test_changed_only_reruns_after_var_or_included_role_edit(tmp_path, monkeypatch):
+    cli_obj, roles = make_changed_only_project(tmp_path, monkeypatch)
+
+    def status() -> str:
+        return cli_obj.run_playbooks(["app"], changed_only=True)[0].status
+
+    assert status() == Status.SUCCESS
+    assert status() == Status.UNCHANGED
+    (roles / "apps" / "app" / "vars" / "main.yaml").write_text("replicas: 2\n")
+    assert status() == Status.SUCCESS
+    assert status() == Status.UNCHANGED
+    (roles / "common" / "inc" / "tasks" / "main.yaml").write_text("- meta: noop\n")
+    assert status() == Status.SUCCESS
+    assert len((tmp_path / "calls").read_text().splitlines()) == 3
+
+
+def test_changed_only_state_is_per_inventory_and_not_set_by_dry_run(
+    tmp_path, monkeypatch
+):
+    cli_obj, _ = make_changed_only_project(tmp_path, monkeypatch)
+
+    def statuses(inventories, **kwargs):
+        results = cli_obj.run_playbooks(
+            ["app"], changed_only=True, inventories=inventories, **kwargs
+        )
+        return {result.inventory: result.status for result in results}
+
+    assert statuses(["dev"], dry_run=True) == {"dev": Status.SUCCESS}
+    assert statuses(["dev"]) == {"dev": Status.SUCCESS}
+    assert statuses(["dev", "prod"]) == {
+        "dev": Status.UNCHANGED,
+        "prod": Status.SUCCESS,
+    }
+    assert statuses(["dev", "prod"]) == {
+        "dev": Status.UNCHANGED,
+        "prod": Status.UNCHANGED,
+    }
+
+
+def test_profile_aggregates_task_durations(tmp_path, capsys):
+    events = [
+        {"event": "task_start", "task": "Add repo", "role": "apps/db", "time": 10.0},
+        {"event": "host_ok", "task": "Add repo", "time": 11.0},
+        {"event": "task_start", "task": "Deploy", "role": "apps/db", "time": 12.0},
+        {"event": "playbook_end", "time": 20.0},
+    ]
+    events_log = tmp_path / "db.events.jsonl"
+    events_log.write_text("".join(json.dumps(e) + "\n" for e in events))
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    tasks = cli_obj._profile_tasks(str(events_log))
+    assert [(t["task"], t["duration"]) for t in tasks] == [
+        ("Add repo", 2.0),
+        ("Deploy", 8.0),
+    ]
+
+    cli_obj.show_profile("db", tasks, 12.0, tmp_path / "db.collapsed")
+    assert (tmp_path / "db.collapsed").read_text().splitlines() == [
+        "db;apps/db;Add repo 2000",
+        "db;apps/db;Deploy 8000",
+        "db;(hors tâches) 2000",
+    ]
+
+
+def test_help_does_not_import_heavy_modules():
+    probe = (
+        "import sys, cli; "
+        "cli.cli.main(['--help'], standalone_mode=False); "
+        "print('MODULES=' + ','.join(m for m in ('yaml', 'asyncio', 'concurrent.futures', "
+        "'subprocess', 'json') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip().splitlines()[-1] == "MODULES="
+
+
+@pytest.mark.skipif(
+    not os.environ.get("CLI_BENCH"), reason="benchmark de démarrage: CLI_BENCH=1"
+)
+def test_help_startup_benchmark():
+    """Benchmark: `cli.py --help` doit rester sous CLI_STARTUP_BUDGET_MS
+
+    Dépend de la machine (l'import de click seul en prend une bonne part):
+    la régression à éviter, l'import de modules lourds, est couverte par
+    test_help_does_not_import_heavy_modules.
+    """
+    budget_ms = float(os.environ.get("CLI_STARTUP_BUDGET_MS", 100))
+
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(ROOT_DIR / "cli.py"), "--help"],
+            capture_output=True,
+            check=True,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+
+    print(f"cli.py --help: min {min(timings):.1f} ms, max {max(timings):.1f} ms")
+    assert min(timings) < budget_ms
+
+
+def test_helm_repos_are_refreshed_once_within_ttl(tmp_path, monkeypatch):
+    calls = tmp_path / "helm_calls"
+    fake_helm = tmp_path / "bin" / "helm"
+    fake_helm.parent.mkdir()
+    fake_helm.write_text(
+        "#!/bin/sh\n"
+        f'echo "$@" >> {calls}\n'
+        '[ "$2" = list ] && echo \'[{"name": "a", "url": "http://repo"}]\'\n'
+        "exit 0\n"
+    )
+    fake_helm.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake_helm.parent}{os.pathsep}{os.environ['PATH']}")
+
+    cli_obj = make_helm_project(tmp_path, {"a": "http://repo", "b": "http://repo"})
+    repos = cli_obj._collect_helm_repos(["a", "b"])
+    assert repos == [("a", "http://repo"), ("b", "http://repo")]
+
+    assert sorted(cli_obj._refresh_helm_repos(repos, ttl=600)) == ["a", "b"]
+    # Seul "a" est connu de helm: "b" est ajouté à chaque exécution
+    assert sorted(cli_obj._refresh_helm_repos(repos, ttl=600)) == ["a", "b"]
+    added = [
+        line for line in calls.read_text().splitlines() if line.startswith("repo add")
+    ]
+    assert sorted(added) == [
+        "repo add a http://repo --force-update",
+        "repo add b http://repo --force-update",
+        "repo add b http://repo --force-update",
+    ]
+
+
+@pytest.mark.skipif(shutil.which("helm") is None, reason="helm non installé")
+def test_helm_repo_refresh_against_local_index(tmp_path, monkeypatch):
+    import functools
+    import http.server
+    import threading
+
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "index.yaml").write_text("apiVersion: v1\nentries: {}\n")
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=str(served)
+    )
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("HELM_REPOSITORY_CONFIG", str(tmp_path / "repositories.yaml"))
+    monkeypatch.setenv("HELM_REPOSITORY_CACHE", str(tmp_path / "cache"))
+
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    cli_obj = make_helm_project(tmp_path, {"local": url})
+    try:
+        repos = cli_obj._collect_helm_repos(["local"])
+        assert cli_obj._refresh_helm_repos(repos, ttl=600) == ["local"]
+        assert (tmp_path / "cache" / "local-index.yaml").exists()
+    finally:
+        server.shutdown()
+
+
+def test_fast_perf_profile_environment(tmp_path, monkeypatch):
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    for name in ("db", "app"):
+        (tmp_path / "ansible" / "playbooks" / f"{name}.yaml").write_text("---\n")
+    (tmp_path / "ansible" / "playbooks.yaml").write_text(
+        "playbooks:\n  db: {}\n  app:\n    strategy: free\n"
+    )
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    assert cli_obj._perf_env("db", "default") == {}
+    env = cli_obj._perf_env("db", "fast")
+    assert env["ANSIBLE_PIPELINING"] == "True"
+    assert env["ANSIBLE_CACHE_PLUGIN"] == "jsonfile"
+    assert env["ANSIBLE_CACHE_PLUGIN_CONNECTION"] == str(cli_obj.facts_cache_dir)
+    assert "ANSIBLE_STRATEGY" not in env
+    assert cli_obj._perf_env("app", "fast")["ANSIBLE_STRATEGY"] == "free"
+
+
+@pytest.mark.skipif(
+    not os.environ.get("CLI_BENCH") or shutil.which("ansible-playbook") is None,
+    reason="benchmark Ansible: CLI_BENCH=1 et ansible-playbook requis",
+)
+def test_fast_perf_profile_benchmark(tmp_path, capsys):
+    """Benchmark: suite locale (connection: local) avec les profils default et fast
+
+    Le profil fast ne doit pas ralentir la suite de plus de
+    PERF_BENCH_TOLERANCE (défaut: 20%).
+    """
+    playbooks = int(os.environ.get("PERF_BENCH_PLAYBOOKS", 3))
+    tolerance = float(os.environ.get("PERF_BENCH_TOLERANCE", 0.2))
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    config = "playbooks:\n"
+    for i in range(playbooks):
+        tasks = "".join(
+            f"    - ansible.builtin.command: echo {j}\n"
+            f"      changed_when: false\n"
+            f"    - ansible.builtin.copy:\n"
+            f"        content: '{{{{ ansible_facts.hostname }}}} {j}'\n"
+            f"        dest: '{tmp_path}/out-{i}-{j}.txt'\n"
+            for j in range(3)
+        )
+        (tmp_path / "ansible" / "playbooks" / f"pb{i}.yaml").write_text(
+            "- hosts: localhost\n  connection: local\n  gather_facts: true\n"
+            "  vars:\n    ansible_python_interpreter: '{{ ansible_playbook_python }}'\n"
+            f"  tasks:\n{tasks}"
+        )
+        config += f"  pb{i}:\n    strategy: free\n"
+    (tmp_path / "ansible" / "playbooks.yaml").write_text(config)
+    cli_obj = AnsibleCLI(str(tmp_path))
+    cli_obj.callback_plugins_dir = ROOT_DIR / "ansible" / "callback_plugins"
+
+    timings = {}
+    for profile in AnsibleCLI.PERF_PROFILES:
+        runs = []
+        # Première exécution (remplissage du cache de faits) non mesurée
+        for _ in range(3):
+            start = time.perf_counter()
+            results = cli_obj.run_playbooks(
+                list(cli_obj.playbooks), inventory="localhost,", perf_profile=profile
+            )
+            runs.append(time.perf_counter() - start)
+            assert all(result.returncode == 0 for result in results)
+        timings[profile] = min(runs[1:])
+
+    with capsys.disabled():
+        print(
+            f"\n{playbooks} playbooks: default {timings['default']:.2f}s, "
+            f"fast {timings['fast']:.2f}s"
+        )
+    assert timings["fast"] < timings["default"] * (1 + tolerance)
+
+
+@pytest.mark.skipif(
+    not os.environ.get("CLI_BENCH") or shutil.which("ansible-playbook") is None,
+    reason="benchmark Ansible: CLI_BENCH=1 et ansible-playbook requis",
+)
+def test_inprocess_engine_benchmark(tmp_path, capsys):
+    """Benchmark: playbooks du projet avec les moteurs thread et inprocess
+
+    Aucune tâche n'est exécutée (tag inexistant, mode --check): seul le coût
+    de lancement d'ansible-playbook et du parsing des playbooks est mesuré.
+    Les collections de requirements.yaml doivent être installées.
+    """
+    shutil.copytree(ROOT_DIR / "ansible", tmp_path / "ansible")
+    shutil.copy(ROOT_DIR / "ansible.cfg", tmp_path)
+    cli_obj = AnsibleCLI(str(tmp_path))
+    names = list(cli_obj.playbooks)
+
+    timings = {}
+    for engine in ("thread", "inprocess"):
+        runs = []
+        for _ in range(2):
+            start = time.perf_counter()
+            results = cli_obj.run_playbooks(
+                names,
+                engine=engine,
+                inventory="localhost,",
+                tags=["cli-bench"],
+                dry_run=True,
+            )
+            runs.append(time.perf_counter() - start)
+            assert all(
+                result.returncode == 0 for result in results
+            ), "collections requises: make install-collections"
+        timings[engine] = min(runs)
+
+    with capsys.disabled():
+        print(
+            f"\n{len(names)} playbooks: thread {timings['thread']:.2f}s, "
+            f"inprocess {timings['inprocess']:.2f}s"
+        )
+    assert timings["inprocess"] < timings["thread"]
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("ansible") is None, reason="ansible-core absent"
+)
+def test_inprocess_engine_runs_playbooks_in_warm_worker(tmp_path):
+    (tmp_path / "ansible" / "playbooks").mkdir(parents=True)
+    for name, command in (("ok", "true"), ("ko", "false")):
+        (tmp_path / "ansible" / "playbooks" / f"{name}.yaml").write_text(
+            "- hosts: localhost\n  connection: local\n  gather_facts: false\n"
+            "  vars:\n    ansible_python_interpreter: '{{ ansible_playbook_python }}'\n"
+            f"  tasks:\n    - name: Run {command}\n"
+            f"      ansible.builtin.command: '{command}'\n"
+        )
+    (tmp_path / "ansible" / "playbooks.yaml").write_text(
+        "playbooks:\n  ok: {}\n  ko: {}\n"
+    )
+    cli_obj = AnsibleCLI(str(tmp_path))
+    cli_obj.callback_plugins_dir = ROOT_DIR / "ansible" / "callback_plugins"
+
+    results = cli_obj.run_playbooks(
+        ["ok", "ko"], parallel=True, engine="inprocess", inventory="localhost,"
+    )
+
+    by_name = {result.name: result for result in results}
+    assert by_name["ok"].returncode == 0
+    assert by_name["ko"].returncode == 2
+    assert by_name["ko"].failures[0].task == "Run false"
+
+
+def test_chartsgouv_cache_config_from_environment(monkeypatch):
+    monkeypatch.setenv("DB_NAME", "analytics")
+    monkeypatch.setenv("REDIS_HOST", "redis")
+    monkeypatch.setenv("REDIS_PASSWORD", "p@ss")
+    monkeypatch.setenv("CHARTSGOUV_CACHE_DATA_TIMEOUT", "600")
+    monkeypatch.setenv("CHARTSGOUV_NODE_DB_POOL_SIZE", "8")
+    spec = importlib.util.spec_from_file_location(
+        "superset_config_override",
+        ROOT_DIR / "ansible/roles/apps/chartsgouv/files/superset_config_override.py",
+    )
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+
+    assert config.DATA_CACHE_CONFIG["CACHE_DEFAULT_TIMEOUT"] == 600
+    assert config.CACHE_CONFIG["CACHE_DEFAULT_TIMEOUT"] == 86400
+    assert config.DATA_CACHE_CONFIG["CACHE_KEY_PREFIX"] == "superset_analytics_data_"
+    assert config.FILTER_STATE_CACHE_CONFIG["CACHE_REDIS_URL"] == (
+        "redis://:p%40ss@redis:6379/1"
+    )
+    assert config.SQLALCHEMY_ENGINE_OPTIONS["pool_size"] == 8
+
+
+def test_connection_plan_flags_overbooked_release(tmp_path, capsys):
+    roles = tmp_path / "ansible" / "roles" / "apps"
+    for role in ("chartsgouv", "n8n", "postgres/service"):
+        shutil.copytree(ROOT_DIR / "ansible" / "roles" / "apps" / role, roles / role)
+    (roles / "postgres/service/vars/main.yaml").write_text(
+        "databases:\n"
+        "  - release_name: pg\n    primary: {max_connections: 50}\n"
+        "  - release_name: pg-dev\n"
+    )
+    (roles / "chartsgouv/vars/main.yaml").write_text(
+        "helm: {release_name: superset}\n"
+        "values_files:\n  scaling: {max_db_connections: 40}\n"
+        "  supersetNode:\n    connections:\n"
+        "      {db_host: pg-postgresql.data.svc, db_name: superset, db_user: superset}\n"
+    )
+    (roles / "n8n/vars/main.yaml").write_text(
+        "values_files:\n  config:\n    db:\n      postgresdb:\n"
+        "        {host: pg-postgresql, database: n8n, username: n8n}\n"
+    )
+    (tmp_path / "ansible" / "playbooks").mkdir()
+    (tmp_path / "ansible" / "playbooks" / "n8n.yaml").write_text(
+        "- hosts: localhost\n  roles:\n    - { role: apps/n8n }\n"
+    )
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    targets, notes = cli_obj.plan_connections()
+    demands = {demand.app: demand for demand in targets["pg"]["demands"]}
+    # 8 processus web (2 pods avec le surge x 4) x 3, 8 processus Celery x 2
+    assert demands["chartsgouv"].connections == 40
+    # poolSize du template de values
+    assert demands["n8n"].connections == 10
+    assert targets["pg"]["max_connections"] == 50
+    assert targets["pg-dev"] == {"max_connections": 100, "demands": []}
+    assert notes == []
+
+    assert cli_obj.check_connections(["n8n"]) is False
+    out = capsys.readouterr().out
+    assert "Total: 50 / 47 (dépassement: 3)" in out
+    assert "superset/superset: pool_size=37 (40 clients)" in out
+    assert "n8n_config/n8n: pool_size=9 (10 clients)" in out
+
+
+def test_connection_plan_ignores_placeholder_hosts(tmp_path):
+    roles = tmp_path / "ansible" / "roles" / "apps"
+    for role in ("airflow", "chartsgouv", "polaris", "postgres/service"):
+        shutil.copytree(ROOT_DIR / "ansible" / "roles" / "apps" / role, roles / role)
+        shutil.copy(
+            roles / role / "vars" / "example.main.yaml",
+            roles / role / "vars" / "main.yaml",
+        )
+    cli_obj = AnsibleCLI(str(tmp_path))
+
+    targets, notes = cli_obj.plan_connections()
+
+    assert list(targets) == ["postgres-prod", "postgres-dev"]
+    assert notes == [
+        f"{app}: hôte Postgres non renseigné, ignoré"
+        for app in ("airflow", "chartsgouv", "polaris")
+    ]